@@ -25,16 +25,160 @@ of the satellites are updated corrected and obeying the laws of physics.
 (see further instructions inside function update_sat).
 """
 #import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.widgets import Button
+import importlib
+import importlib.util
+import os
+import queue
+import sys
+import threading
 import time
 
+def _common(name):
+    """
+    Imports common/<name>.py from the repository root next to this folder, as
+    fy122a_common.<name>, so importers do not need the root on sys.path and
+    may have another package called common.
+    """
+    if 'fy122a_common' not in sys.modules:
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common')
+        spec = importlib.util.spec_from_file_location('fy122a_common', os.path.join(root, '__init__.py'),
+                                                      submodule_search_locations=[root])
+        sys.modules['fy122a_common'] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sys.modules['fy122a_common'])
+    return importlib.import_module('fy122a_common.' + name)
+
+instrument = _common('instrument')
+
+# matplotlib is imported in main(), so update_sat can be imported without
+# loading a GUI backend.
+
 docked = 0  # Flag for controlling if the satellites
             # have docked (docked = 1) or not (docked = 0)
 t_lim = 40  # The duration in seconds the simulation lasts.
             # Should be around 40 s at hand in, but can be changed during
             # the development of the function.
 
+contact_distance = 5   # The satellites touch when they are this close (m)
+docking_speed = 2      # Largest relative velocity (m/s) for docking
+
+def time_to_contact(gap, w, a, dt):
+    """
+    The first time 0 <= tau <= dt at which the satellites are contact_distance
+    apart while they approach each other, or None if they do not meet in the step.
+
+    gap (float): x2 - x1 at the start of the step
+    w (float):   v2 - v1 at the start of the step
+    a (float):   a2 - a1, the relative acceleration during the step
+
+    With constant accelerations the distance is a quadratic in tau, so the
+    contact time is solved exactly instead of checked at the end of the step.
+    """
+    # Works for either satellite on the left by measuring along the direction from 1 to 2
+    side = 1 if gap >= 0 else -1
+    C = side*gap - contact_distance
+    B = side*w
+    A = side*a/2
+
+    if C <= 0:
+        # Already in contact: a contact now if they still approach, otherwise
+        # they separate and can only meet again later in the step
+        if B < 0 or (B == 0 and A < 0):
+            return 0.0
+        C = 0.0
+
+    # A*tau**2 + B*tau + C = 0, with the roots calculated without cancellation
+    if A == 0:
+        roots = [-C/B] if B < 0 else []
+    else:
+        disc = B*B - 4*A*C
+        if disc < 0:
+            return None
+        q = -(B + (disc**0.5 if B >= 0 else -disc**0.5))/2
+        roots = [q/A, C/q] if q != 0 else [0.0]
+
+    # The earliest root in the step where the distance is decreasing
+    roots = [tau for tau in roots if 0 <= tau <= dt and B + 2*A*tau < 0]
+    return min(roots) if roots else None
+
+@instrument.timed('au1.step_sat')
+def step_sat(x1,x2,v1,v2,F,dt,m1,m2,docked=0,log=None,contacts=None):
+    """
+    One time step of update_sat without any global state, for the headless
+    simulation in simulate(). The masses are given as arguments, and instead of
+    setting docked the function returns what happened in the step as a fifth
+    value: event = 0 (nothing), 1 (docked) or 2 (collision). The messages that
+    update_sat prints are passed to log if it is given. If contacts is a list,
+    (time after the start of the step, event) is appended to it for every
+    contact in the step.
+
+    The accelerations are constant during the step, so the motion is integrated
+    exactly (x + v*t + a*t**2/2). The time when the satellites reach
+    contact_distance is solved for inside the step (time_to_contact), the
+    collision or docking is applied at that time, and the rest of the step is
+    integrated with the new velocities. The satellites can therefore not pass
+    through each other however large dt is. Once docked (docked = 1), they move
+    together with the thrust shared by both masses.
+    """
+    log = log or (lambda *args: None)
+    event = 0
+    remaining = dt
+    elapsed = 0.0
+
+    # Some steps can have more than one contact, e.g. a bounce followed by the
+    # thrust pushing satellite 1 back into satellite 2. Each contact either docks
+    # the satellites or makes them separate, so there are only a few
+    for _ in range(10):
+        if docked == 1:
+            # Docked: one body with both masses
+            a1 = a2 = F/(m1+m2)
+            tau = None
+        else:
+            a1 = F/m1
+            a2 = 0
+            tau = time_to_contact(x2-x1, v2-v1, a2-a1, remaining)
+
+        step = remaining if tau is None else tau
+
+        # position = x + v*t + a*t**2/2, velocity = v + a*t
+        x1 = x1 + v1*step + a1*step**2/2
+        x2 = x2 + v2*step + a2*step**2/2
+        v1 = v1 + a1*step
+        v2 = v2 + a2*step
+        remaining -= step
+        elapsed += step
+
+        if tau is None:
+            break
+
+        # if the relative velocity is < 2 m/s, docking successful:
+        # totally inelastic collision, with conservation of momentum
+        if abs(v2-v1) < docking_speed:
+            event = docked = 1
+            log("Satellite 1 speed before docking: ",v1)
+
+            v1 = v2 = (m1*v1 + m2*v2)/(m1+m2)
+
+            log("Satellite 1 and 2 speed after docking: ",v2)
+
+        # if the relative velocity is >= 2 m/s, there is a collision:
+        # elastic collision, with conservation of momentum and energy
+        else:
+            event = docked = 2
+
+            vnew1 = ((m1-m2)*v1 + 2*m2*v2)/(m1+m2)
+            vnew2 = ((m2-m1)*v2 + 2*m1*v1)/(m1+m2)
+            log("Satellite 1 speed BEFORE collision: ",v1)
+            log("Satellite 1 speed AFTER collision: ",vnew1)
+            log("Satellite 2 speed BEFORE collision: ",v2)
+            log("Satellite 2 speed AFTER collision: ",vnew2)
+            v1, v2 = vnew1, vnew2
+
+        if contacts is not None:
+            contacts.append((elapsed, event))
+
+    return x1,x2,v1,v2,event
+
+@instrument.timed('au1.update_sat')
 def update_sat(x1,x2,v1,v2,F,dt):
     """
     Indata:
@@ -62,42 +206,10 @@ def update_sat(x1,x2,v1,v2,F,dt):
     which is modeled as an elastic collision (elastisk stot).
     """
     global docked
-    
-    # position 1 = previous position + (velocity * time step)
-    xnew1 = x1 + (v1*dt) 
-    # velocity 1 = v(t+dt) = v(t) + a(t)*dt 
-    vnew1 = v1 + ((F/m1)*dt)
-
-    xnew2 = x2 + (v2*dt)
-    vnew2 = v2
-
-    # if distance is less than 5
-    if abs(xnew2-xnew1)<5: 
 
-        # if speed 1 is < 2m/s, docking successful 
-        if abs(vnew2-vnew1) < 2: 
-            docked = 1 
-            print("Satellite 1 speed before docking: ",vnew1)
-
-            # this is only true when satellite 2 is still, which here is the case. 
-            vnew1 = ((m1)/(m1+m2))*vnew1
-            vnew2 = vnew1
-
-            print("Satellite 1 and 2 speed after docking: ",vnew2)
-
-        # if speed 1 is >= 2m/s, there is a collision 
-        else :
-            docked = 2 
-
-            vnew1 = ((m1-m2)/(m1+m2))*v1
-            xnew1 = x1 + (vnew1*dt)
-            print("Satellite 1 speed BEFORE collision: ",v1)
-            print("Satellite 1 speed AFTER collision: ",vnew1)
-
-            vnew2 = ((2*m1)/(m1+m2))*v1
-            xnew2 = x2 + (vnew2*dt)
-            print("Satellite 2 speed BEFORE collision: ",v2)
-            print("Satellite 2 speed AFTER collision: ",vnew2)
+    xnew1,xnew2,vnew1,vnew2,event = step_sat(x1,x2,v1,v2,F,dt,m1,m2,docked=docked,log=print)
+    if event:
+        docked = event
 
     return xnew1,xnew2,vnew1,vnew2
 
@@ -114,86 +226,267 @@ v2 = 0
 
 #///////////////////////////////////////
 
-fig, ax = plt.subplots()
-# Adjust figure to make room for buttons
-fig.subplots_adjust(bottom=0.25)
+outcomes = {0: None, 1: 'docked', 2: 'collision'}
 
-# Create button which decrease force with 50 N.
-decrax = fig.add_axes([0.2, 0.05, 0.2, 0.08])
-decr_button = Button(decrax, 'Decrease Thrust', hovercolor='0.975')
+def thrust_schedule(changes):
+    """
+    Thrust as a function of time from a list of (time, force) pairs sorted by
+    time, e.g. [(0, 300), (5, 250), (12, 300)]. The force is held constant until
+    the next change, like pressing the thrust buttons at those times.
+    """
+    def thrust(t):
+        force = changes[0][1]
+        for time_, value in changes:
+            if time_ > t:
+                break
+            force = value
+        return force
+    return thrust
 
-def decr(event):
-    global F
-    F = F - 50.0
-    
-decr_button.on_clicked(decr)
+def simulate(x1=x1, x2=x2, v1=v1, v2=v2, thrust=F, dt=0.01, t_lim=t_lim, m1=m1, m2=m2, stop_on_contact=False):
+    """
+    Runs the docking without a window, with a fixed time step dt instead of the
+    wall clock, so a run takes milliseconds and gives the same result every time.
 
-# Create button which increase force with 50 N.
-incrax = fig.add_axes([0.65, 0.05, 0.2, 0.08])
-incr_button = Button(incrax, 'Increase Thrust', hovercolor='0.975')
+    thrust is the force on satellite 1: a number, a function of time or a list
+    of (time, force) pairs (see thrust_schedule). With stop_on_contact the run
+    ends at the first docking or collision.
 
-def incr(event):
-    global F
-    F = F + 50.0
-    
-incr_button.on_clicked(incr)
+    Returns a dict with the trajectory (t, x1, x2, v1, v2 and F as lists, one
+    value per step), events (a list of (time, 'docked' or 'collision') with the
+    exact time of every contact, also several in one step) and the outcome,
+    which is the last event like the docked flag in the GUI, or None.
+    """
+    if not callable(thrust):
+        thrust = thrust_schedule(thrust if isinstance(thrust, (list, tuple)) else [(0, thrust)])
 
-#///////////////////////////////////////
+    result = {'t': [0.0], 'x1': [x1], 'x2': [x2], 'v1': [v1], 'v2': [v2], 'F': [thrust(0.0)], 'events': []}
+    state = 0
+    contacts = []
 
-tstart = time.time()
-telapsed = 0
-told = tstart
+    for i in range(1, int(round(t_lim/dt)) + 1):
+        del contacts[:]
+        x1,x2,v1,v2,event = step_sat(x1,x2,v1,v2,result['F'][-1],dt,m1,m2,docked=state,contacts=contacts)
+        t = i*dt
 
-# Main loop startshere
-while telapsed <= t_lim:
-    # Deduce time and time step
-    tnew = time.time()
-    dt = tnew - told
-    told = tnew
-    
-    # Call to function update_sat
-    x1,x2,v1,v2 = update_sat(x1,x2,v1,v2,F,dt)
-    
-    telapsed = time.time() - tstart
-    
-    # Update plot
-    ax.plot(x1,0,'wo')
-    ax.plot(x2,0,'ro',markersize=10)
-    ax.set_xlabel('x (m)',fontsize=12)
-    ax.set_xlim([-150,50])
-    ax.set_facecolor("black")
-    ax.tick_params(labelsize=12, left = False, labelleft = False)
-    
-    # Update text
-    textstr = '\n'.join((
-    'Time: %6.2f s' % (telapsed,),
-    'Distance: %6.2f m' % (abs(x2-x1), ),
-    'Relative  velocity: %6.2f m/s' % (abs(v2-v1), )))
-    props = dict(boxstyle='round', facecolor='wheat', alpha=1.0)
-    ax.text(0.25, 0.9, textstr, transform=ax.transAxes, fontsize=12,
-        verticalalignment='top', bbox=props)
-    textstr2 = ('Force: %4.1f N' % (F))
-    ax.text(0.4, -0.225, textstr2, transform=ax.transAxes, fontsize=12,
-        verticalalignment='top')
-    
-    # If succesful docking
-    textstring = "Docking successful!"
-    if docked == 1:
-        ax.text(0.5, 0.2, textstring, transform=ax.transAxes, color="white", fontsize=10,
-        verticalalignment='top')
-
-    # Collision (ADDED)
-    textstring = "Oh no, collision!"
-    if docked == 2:
-        ax.text(0.5, 0.2, textstring, transform=ax.transAxes, color="white", fontsize=10,
-        verticalalignment='top')
-    
-    plt.pause(0.1)
-    
-    # Don't clear the last plot
-    if telapsed < t_lim:
-        ax.cla()
-    
+        result['t'].append(t)
+        result['x1'].append(x1)
+        result['x2'].append(x2)
+        result['v1'].append(v1)
+        result['v2'].append(v2)
+        result['F'].append(thrust(t))
 
-    
-    
\ No newline at end of file
+        if event:
+            state = event
+            result['events'] += [((i - 1)*dt + offset, outcomes[contact]) for offset, contact in contacts]
+            if stop_on_contact:
+                break
+
+    result['outcome'] = outcomes[state]
+    return result
+
+class Renderer:
+    """
+    Draws the satellites and the text boxes. The artists are created once and
+    only their data and text are changed every frame. With a backend that can
+    blit, the static parts (axes, ticks, buttons) are saved as a background
+    image, and each frame restores it and draws only the changed artists on top,
+    instead of clearing and rebuilding the whole axes.
+
+    Text is by far the slowest thing to draw, so the text boxes are drawn onto a
+    second saved image, which is only redrawn when the force or the docking
+    status changes, or every text_interval seconds for the time and distance.
+    Other frames only draw the two satellites.
+    """
+    def __init__(self, fig, ax, text_interval=0.1):
+        self.fig = fig
+        self.ax = ax
+        self.canvas = fig.canvas
+        self.text_interval = text_interval
+
+        ax.set_xlabel('x (m)',fontsize=12)
+        ax.set_xlim([-150,50])
+        ax.set_facecolor("black")
+        ax.tick_params(labelsize=12, left = False, labelleft = False)
+
+        self.sat1, = ax.plot([],[],'wo', animated=True)
+        self.sat2, = ax.plot([],[],'ro',markersize=10, animated=True)
+
+        props = dict(boxstyle='round', facecolor='wheat', alpha=1.0)
+        self.info = ax.text(0.25, 0.9, '', transform=ax.transAxes, fontsize=12,
+            verticalalignment='top', bbox=props, animated=True)
+        self.force = ax.text(0.4, -0.225, '', transform=ax.transAxes, fontsize=12,
+            verticalalignment='top', animated=True)
+        self.status = ax.text(0.5, 0.2, '', transform=ax.transAxes, color="white", fontsize=10,
+            verticalalignment='top', animated=True)
+
+        self.texts = (self.info, self.force, self.status)
+        self.markers = (self.sat1, self.sat2)
+        self.background = None
+        self.text_layer = None
+        self.text_time = None
+        self.blit = getattr(self.canvas, 'supports_blit', False)
+
+        # A full redraw (first show, resize, button hover) also saves a new background
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event):
+        if self.blit:
+            self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+            self.text_layer = None
+        for artist in self.texts + self.markers:
+            self.fig.draw_artist(artist)
+
+    def update(self, telapsed, x1, x2, v1, v2, F, docked):
+        self.sat1.set_data([x1],[0])
+        self.sat2.set_data([x2],[0])
+
+        # If succesful docking, or collision
+        force = 'Force: %4.1f N' % (F)
+        status = {1: "Docking successful!", 2: "Oh no, collision!"}.get(docked, '')
+
+        redraw_text = (self.text_layer is None or force != self.force.get_text() or status != self.status.get_text()
+            or telapsed - self.text_time >= self.text_interval)
+
+        if redraw_text:
+            instrument.count('au1.text_redraws')
+            self.info.set_text('\n'.join((
+            'Time: %6.2f s' % (telapsed,),
+            'Distance: %6.2f m' % (abs(x2-x1), ),
+            'Relative  velocity: %6.2f m/s' % (abs(v2-v1), ))))
+            self.force.set_text(force)
+            self.status.set_text(status)
+            self.text_time = telapsed
+
+        if self.background is None:
+            # Nothing drawn yet, or no blitting: draw everything
+            self.canvas.draw()
+        else:
+            if redraw_text:
+                self.canvas.restore_region(self.background)
+                for text in self.texts:
+                    self.fig.draw_artist(text)
+                self.text_layer = self.canvas.copy_from_bbox(self.fig.bbox)
+            else:
+                self.canvas.restore_region(self.text_layer)
+
+            for marker in self.markers:
+                self.fig.draw_artist(marker)
+            self.canvas.blit(self.fig.bbox)
+        self.canvas.flush_events()
+
+class PhysicsThread(threading.Thread):
+    """
+    Runs step_sat in a background thread with a fixed time step dt (1 ms by
+    default), in step with the wall clock, until the simulated time reaches
+    t_lim. The physics therefore does not depend on how long the drawing takes.
+
+    Thrust changes are sent with command(), which puts them on a thread safe
+    queue that is read before every step, so a button press reaches the physics
+    within one step. The renderer reads the newest state with latest() at its
+    own frame rate.
+
+    If the thread falls behind the wall clock (e.g. while the window is being
+    moved), it catches up with at most max_catchup steps at a time and
+    otherwise lets the simulation run slower, instead of taking longer steps.
+    """
+    def __init__(self, x1, x2, v1, v2, F, dt=0.001, t_lim=t_lim, max_catchup=100):
+        super().__init__(daemon=True)
+        self.dt = dt
+        self.t_lim = t_lim
+        self.max_catchup = max_catchup
+        self.commands = queue.Queue()
+        self.stopped = threading.Event()
+        # (t, x1, x2, v1, v2, F, docked), replaced as a whole after every step
+        self.state = (0.0, x1, x2, v1, v2, F, 0)
+
+    def command(self, delta=None, force=None):
+        # Change the thrust by delta, or set it to force
+        self.commands.put((delta, force))
+
+    def latest(self):
+        return self.state
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        t, x1, x2, v1, v2, F, docked = self.state
+        steps = 0
+        start = time.perf_counter()
+
+        while t < self.t_lim and not self.stopped.is_set():
+            behind = int((time.perf_counter() - start - t)/self.dt)
+            for _ in range(min(max(behind, 0), self.max_catchup)):
+                while not self.commands.empty():
+                    delta, force = self.commands.get_nowait()
+                    instrument.count('au1.thrust_commands')
+                    F = F + delta if force is None else force
+
+                x1,x2,v1,v2,event = step_sat(x1,x2,v1,v2,F,self.dt,m1,m2,docked=docked,log=print)
+                docked = event or docked
+                steps += 1
+                t = steps*self.dt
+                self.state = (t, x1, x2, v1, v2, F, docked)
+
+            if behind > self.max_catchup:
+                instrument.count('au1.physics_dropped_steps', behind - self.max_catchup)
+                # Too far behind: continue from the current time instead
+                start = time.perf_counter() - t
+
+            time.sleep(max(0.0, start + t + self.dt - time.perf_counter()))
+
+def main(x1=x1, x2=x2, v1=v1, v2=v2, fps=60, dt=0.001):
+    import matplotlib.pyplot as plt
+    from matplotlib.widgets import Button
+
+    physics = PhysicsThread(x1, x2, v1, v2, F, dt=dt, t_lim=t_lim)
+
+    fig, ax = plt.subplots()
+    # Adjust figure to make room for buttons
+    fig.subplots_adjust(bottom=0.25)
+
+    # Create button which decrease force with 50 N.
+    decrax = fig.add_axes([0.2, 0.05, 0.2, 0.08])
+    decr_button = Button(decrax, 'Decrease Thrust', hovercolor='0.975')
+
+    def decr(event):
+        physics.command(delta=-50.0)
+
+    decr_button.on_clicked(decr)
+
+    # Create button which increase force with 50 N.
+    incrax = fig.add_axes([0.65, 0.05, 0.2, 0.08])
+    incr_button = Button(incrax, 'Increase Thrust', hovercolor='0.975')
+
+    def incr(event):
+        physics.command(delta=50.0)
+
+    incr_button.on_clicked(incr)
+
+    renderer = Renderer(fig, ax)
+    plt.show(block=False)
+
+    #///////////////////////////////////////
+
+    physics.start()
+
+    # Main loop startshere. It only draws the newest state, the physics runs in
+    # its own thread until t_lim
+    while physics.is_alive():
+        tframe = time.time()
+
+        telapsed, x1, x2, v1, v2, force, docked = physics.latest()
+        with instrument.timer('au1.render'):
+            renderer.update(telapsed, x1, x2, v1, v2, force, docked)
+
+        # Wait for the next frame. Drawing takes about a millisecond, so the
+        # frame rate is set by fps instead of by the drawing
+        with instrument.timer('au1.sleep'):
+            time.sleep(max(0.0, 1/fps - (time.time() - tframe)))
+
+    # Draw the final state
+    renderer.update(*physics.latest())
+
+if __name__ == "__main__":
+    main()
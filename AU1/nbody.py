@@ -0,0 +1,187 @@
+"""
+Docking simulation for any number of satellites on the x axis.
+
+The satellites are stored as a struct of arrays (position, velocity, mass and
+thrust, one NumPy array each), and every time step moves all of them with one
+vectorized update. Satellites that have docked belong to the same group and
+move together, with the thrust of the group shared by its total mass.
+
+Contacts are found with sort and sweep: the x interval each satellite sweeps
+during the step is sorted by its left end, and np.searchsorted gives the
+satellites whose intervals overlap it. Only those pairs get the exact contact
+time from the same quadratic as time_to_contact in au1_student.py, so a step
+costs O(n log n) instead of checking all n**2 pairs.
+
+The collision rule is the one in au1_student.step_sat: docking (totally
+inelastic) below docking_speed relative velocity, an elastic collision
+otherwise.
+"""
+import numpy as np
+from au1_student import contact_distance, docking_speed
+
+def contact_times(gap, w, a, dt, distance=contact_distance):
+    """
+    Vectorized time_to_contact: for every pair, the first time 0 <= tau <= dt
+    at which the pair is distance apart and approaching, or nan.
+
+    gap, w and a are the relative position, velocity and acceleration (x_j - x_i
+    etc.) at the start of the step.
+    """
+    side = np.where(gap >= 0, 1.0, -1.0)
+    C = side*gap - distance
+    B = side*w
+    A = side*a/2
+
+    # Pairs already in contact touch now if they approach, otherwise they can
+    # only meet again later in the step
+    touching = C <= 0
+    approaching = (B < 0) | ((B == 0) & (A < 0))
+    C = np.where(touching, 0.0, C)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        disc = B*B - 4*A*C
+        sq = np.sqrt(np.maximum(disc, 0.0))
+        q = -(B + np.where(B >= 0, sq, -sq))/2
+        roots = np.stack([np.where(A != 0, q/A, np.nan), np.where(q != 0, C/q, 0.0)])
+
+    valid = (disc >= 0) & (roots >= 0) & (roots <= dt) & (B + 2*A*roots < 0)
+    tau = np.where(valid, roots, np.inf).min(axis=0)
+    tau = np.where(touching & approaching, 0.0, tau)
+    return np.where(np.isfinite(tau), tau, np.nan)
+
+def sweep_pairs(lo, hi):
+    """
+    All pairs (i, j) whose intervals [lo, hi] overlap, found by sorting the
+    intervals by lo and searching for the last interval that starts before
+    each one ends.
+    """
+    order = np.argsort(lo, kind='stable')
+    lo_sorted = lo[order]
+    end = np.searchsorted(lo_sorted, hi[order], side='right')
+
+    # Interval k in sorted order overlaps the ones from k+1 up to end[k]
+    counts = end - np.arange(len(lo)) - 1
+    first = np.repeat(np.arange(len(lo)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    second = first + 1 + offsets
+
+    return order[first], order[second]
+
+class Bodies:
+    """
+    N satellites as arrays x, v, m and F (thrust on each satellite), and
+    group, where satellites with the same group number are docked.
+    """
+    def __init__(self, x, v, m, F=0.0):
+        self.x, self.v, self.m, self.F = [np.array(p, dtype=float) for p in np.broadcast_arrays(x, v, m, F)]
+        self.group = np.arange(len(self.x))
+        self.t = 0.0
+
+    def __len__(self):
+        return len(self.x)
+
+    def acceleration(self):
+        # The thrust of each docked group divided by the total mass of the group
+        force = np.bincount(self.group, weights=self.F, minlength=len(self))
+        mass = np.bincount(self.group, weights=self.m, minlength=len(self))
+        return (force/np.where(mass > 0, mass, 1.0))[self.group]
+
+    def _advance(self, a, tau):
+        # Exact motion with constant acceleration
+        self.x += self.v*tau + a*tau**2/2
+        self.v += a*tau
+
+    def _contacts(self, a, dt):
+        # Candidate pairs from the intervals swept during dt, then the exact contact times
+        x_end = self.x + self.v*dt + a*dt**2/2
+        # The extreme position can be inside the step when the acceleration turns the satellite
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_turn = np.clip(np.where(a != 0, -self.v/a, 0.0), 0, dt)
+        x_turn = self.x + self.v*t_turn + a*t_turn**2/2
+
+        lo = np.minimum(np.minimum(self.x, x_end), x_turn) - contact_distance/2
+        hi = np.maximum(np.maximum(self.x, x_end), x_turn) + contact_distance/2
+        i, j = sweep_pairs(lo, hi)
+
+        other = self.group[i] != self.group[j]
+        i, j = i[other], j[other]
+        tau = contact_times(self.x[j] - self.x[i], self.v[j] - self.v[i], a[j] - a[i], dt)
+        hit = ~np.isnan(tau)
+        return tau[hit], i[hit], j[hit]
+
+    def _collide(self, i, j):
+        gi = self.group == self.group[i]
+        gj = self.group == self.group[j]
+        Mi = self.m[gi].sum()
+        Mj = self.m[gj].sum()
+        vi = self.v[i]
+        vj = self.v[j]
+
+        # They may already have been separated by another contact at the same time
+        if (vj - vi)*(self.x[j] - self.x[i]) > 0:
+            return None
+
+        if abs(vj - vi) < docking_speed:
+            self.v[gi | gj] = (Mi*vi + Mj*vj)/(Mi + Mj)
+            self.group[gj] = self.group[i]
+            return 'docked'
+
+        self.v[gi] = ((Mi - Mj)*vi + 2*Mj*vj)/(Mi + Mj)
+        self.v[gj] = ((Mj - Mi)*vj + 2*Mi*vi)/(Mi + Mj)
+        return 'collision'
+
+    def step(self, dt, max_events=100):
+        """
+        Moves all satellites dt forward. The step is split at every contact:
+        all satellites are moved to the time of the earliest contact, the
+        contacts at that time are resolved, and the rest of the step is searched
+        again. After max_events contacts the rest of the step is moved without
+        further checks.
+
+        Returns a list of (t, i, j, 'docked' or 'collision').
+        """
+        events = []
+        remaining = dt
+        a = self.acceleration()
+
+        while remaining > 0:
+            tau, i, j = self._contacts(a, remaining) if len(events) < max_events else ((), (), ())
+            if len(tau) == 0:
+                self._advance(a, remaining)
+                self.t += remaining
+                break
+
+            first = np.min(tau)
+            self._advance(a, first)
+            self.t += first
+            remaining -= first
+
+            resolved = False
+            for k in np.flatnonzero(tau == first):
+                outcome = self._collide(i[k], j[k])
+                if outcome:
+                    events.append((float(self.t), int(i[k]), int(j[k]), outcome))
+                    resolved = True
+            a = self.acceleration()
+
+            # Guard against finding the same contacts again when none of them
+            # could be resolved
+            if first == 0 and not resolved:
+                self._advance(a, remaining)
+                self.t += remaining
+                break
+
+        return events
+
+    def run(self, t_lim, dt, record_every=None):
+        """
+        Steps until t_lim. Returns the events, and with record_every the
+        positions every record_every:th step as an array (n_records, n).
+        """
+        events = []
+        positions = []
+        for k in range(int(round(t_lim/dt))):
+            if record_every and k % record_every == 0:
+                positions.append(self.x.copy())
+            events += self.step(dt)
+        return (events, np.array(positions)) if record_every else events
@@ -0,0 +1,175 @@
+"""
+Search for thrust schedules that dock satellite 1 with satellite 2.
+
+A schedule is a number of equally long segments with constant thrust, in steps
+of 50 N like the thrust buttons. With constant thrust the motion in every
+segment is a quadratic, so a whole batch of schedules is evaluated at once
+from the segment start positions and velocities (cumulative sums) and the
+exact contact time in each segment (nbody.contact_times), without stepping
+through time. After the last segment satellite 1 coasts.
+
+The schedules are searched with the cross-entropy method: every segment has a
+probability for each thrust level, a batch of schedules is drawn from them,
+and the probabilities are moved towards the best schedules of the batch. The
+batch can be split over several processes, each drawing its schedules from its
+own random generator from np.random.SeedSequence.spawn.
+"""
+import numpy as np
+from au1_student import m1, x1, x2, v1, docking_speed
+from nbody import contact_times
+
+def thrust_levels(max_force=300, step=50):
+    return np.arange(-max_force, max_force + step, step, dtype=float)
+
+def evaluate(forces, segment_time, horizon=120, x1=x1, x2=x2, v1=v1, m1=m1):
+    """
+    Contact time, relative velocity at contact and impulse used until contact
+    for every schedule in forces (n_schedules, n_segments), with satellite 2 at
+    rest at x2. Schedules that do not reach satellite 2 before horizon get nan
+    contact time. feasible is True where the satellites dock, i.e. meet with
+    a relative velocity below docking_speed.
+    """
+    forces = np.asarray(forces, dtype=float)
+    n, segments = forces.shape
+
+    # The last segment is coasting until the horizon
+    a = np.hstack([forces/m1, np.zeros((n, 1))])
+    durations = np.append(np.full(segments, segment_time), max(horizon - segments*segment_time, 0.0))
+    starts = np.concatenate([[0.0], np.cumsum(durations)[:-1]])
+
+    # Velocity and position at the start of every segment
+    dv = a*durations
+    dx = a*durations**2/2
+    v = v1 + np.hstack([np.zeros((n, 1)), np.cumsum(dv, axis=1)[:, :-1]])
+    x = x1 + np.hstack([np.zeros((n, 1)), np.cumsum(v[:, :-1]*durations[:-1] + dx[:, :-1], axis=1)])
+
+    tau = contact_times(x2 - x, -v, -a, durations)
+
+    # The first segment with a contact
+    hit = ~np.isnan(tau)
+    reached = hit.any(axis=1)
+    first = np.argmax(hit, axis=1)
+    rows = np.arange(n)
+    tau_first = np.where(reached, tau[rows, first], np.nan)
+
+    contact_time = starts[first] + tau_first
+    contact_speed = np.abs(v[rows, first] + a[rows, first]*tau_first)
+
+    # |F|*time for the whole segments before the contact and the part of the contact segment
+    used = np.where(np.arange(segments + 1) < first[:, None], durations, 0.0)
+    used[rows, first] = np.where(reached, tau_first, 0.0)
+    impulse = np.sum(np.abs(a*m1)*used, axis=1)
+
+    return {
+        'contact_time': contact_time,
+        'contact_speed': contact_speed,
+        'impulse': impulse,
+        'feasible': reached & (contact_speed < docking_speed),
+    }
+
+def _score(result, objective):
+    return np.where(result['feasible'], result[objective], np.inf)
+
+def _sample(probs, n, rng):
+    # One level index per segment, drawn from the probabilities of that segment
+    cumulative = np.cumsum(probs, axis=1)
+    u = rng.random((n, len(probs)))*cumulative[:, -1]
+    return np.stack([np.searchsorted(cumulative[k], u[:, k], side='right') for k in range(len(probs))], axis=1)
+
+def _search_batch(probs, n, seed, levels, segment_time, horizon, objective, n_elite, chunk_size):
+    """
+    Draws and evaluates n schedules in chunks of chunk_size, and returns the
+    n_elite best as (level indices, scores), and the number of feasible ones.
+    """
+    rng = np.random.default_rng(seed)
+    best_index = np.empty((0, len(probs)), dtype=int)
+    best_score = np.empty(0)
+    feasible = 0
+
+    for start in range(0, n, chunk_size):
+        index = _sample(probs, min(chunk_size, n - start), rng)
+        result = evaluate(levels[index], segment_time, horizon)
+        score = _score(result, objective)
+        feasible += int(np.count_nonzero(result['feasible']))
+
+        best_index = np.vstack([best_index, index])
+        best_score = np.concatenate([best_score, score])
+        keep = np.argsort(best_score, kind='stable')[:n_elite]
+        best_index, best_score = best_index[keep], best_score[keep]
+
+    return best_index, best_score, feasible
+
+def optimize(objective='contact_time', segments=8, segment_time=2.0, max_force=300, horizon=120,
+             n_candidates=100000, iterations=10, elite=0.01, smoothing=0.7, workers=None, seed=None,
+             chunk_size=2**16):
+    """
+    Cross-entropy search for the schedule that docks with the shortest
+    contact_time or the smallest impulse (objective). Every iteration evaluates
+    n_candidates schedules, split over workers processes if workers is set.
+    The same seed gives the same result for the same number of workers.
+
+    Returns a dict with the best schedule as forces per segment and as
+    (time, force) changes for au1_student.simulate, its score and evaluation,
+    the number of evaluated and feasible schedules, and the best score of every
+    iteration.
+    """
+    levels = thrust_levels(max_force)
+    probs = np.full((segments, len(levels)), 1/len(levels))
+    n_elite = max(1, int(elite*n_candidates))
+    n_jobs = workers or 1
+    seeds = np.random.SeedSequence(seed)
+
+    best_index = None
+    best_score = np.inf
+    history = []
+    evaluated = 0
+    feasible = 0
+
+    pool = None
+    if workers is not None:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=workers)
+
+    try:
+        for iteration in range(iterations):
+            sizes = [len(part) for part in np.array_split(np.arange(n_candidates), n_jobs)]
+            args = [(probs, size, child, levels, segment_time, horizon, objective, n_elite, chunk_size)
+                    for size, child in zip(sizes, seeds.spawn(n_jobs))]
+
+            if pool is None:
+                results = [_search_batch(*arg) for arg in args]
+            else:
+                results = [future.result() for future in [pool.submit(_search_batch, *arg) for arg in args]]
+
+            index = np.vstack([r[0] for r in results])
+            score = np.concatenate([r[1] for r in results])
+            feasible += sum(r[2] for r in results)
+            evaluated += n_candidates
+
+            keep = np.argsort(score, kind='stable')[:n_elite]
+            index, score = index[keep], score[keep]
+            if score[0] < best_score:
+                best_index, best_score = index[0], score[0]
+            history.append(score[0])
+
+            # Move the probabilities towards the level counts of the feasible elite
+            elite_index = index[np.isfinite(score)]
+            if len(elite_index):
+                counts = np.stack([np.bincount(elite_index[:, k], minlength=len(levels)) for k in range(segments)])
+                probs = smoothing*counts/len(elite_index) + (1 - smoothing)*probs
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if best_index is None:
+        best_index = np.argmin(np.abs(levels))*np.ones(segments, dtype=int)
+    forces = levels[best_index]
+    return {
+        'forces': forces,
+        'schedule': [(k*segment_time, force) for k, force in enumerate(forces)] + [(segments*segment_time, 0.0)],
+        'score': best_score,
+        'result': {key: value[0] for key, value in evaluate(forces[None, :], segment_time, horizon).items()},
+        'evaluated': evaluated,
+        'feasible': feasible,
+        'history': history,
+    }
@@ -1,5 +1,5 @@
 import numpy as np
-import matplotlib.pyplot as plt
+import plotting
 
 # Constants
 c = 1 # the damping coefficient
@@ -16,18 +16,24 @@ def A(omega):
 omega_min = omega_0 - 1
 omega_max = omega_0 + 1
 
-# Array of omega values
-# Creates a list of 100 evenly spaced values between omega_min and omega_max
-omega = np.linspace(omega_min, omega_max, 100)
+# Plot the amplitude curve
+def plot(omega, A_omega):
+ plt, fastplot = plotting.load()
 
-# Defines the variable A_omega as the result of calling the function A with the argument omega.
-A_omega = A(omega)
+ fastplot.plot(omega, A_omega)
+ plt.xlabel('Drive Frequency (omega)', fontsize=15)
+ plt.ylabel('Amplitude (A(omega))', fontsize=15)
+ plt.title('Amplitude curve as a function of drive frequency', fontsize=15)
+ plt.xticks(fontsize=14) # set font size for x-axis ticks
+ plt.yticks(fontsize=14) # set font size for y-axis ticks
+ plt.show()
 
-# Plot the amplitude curve
-plt.plot(omega, A_omega)
-plt.xlabel('Drive Frequency (omega)', fontsize=15)
-plt.ylabel('Amplitude (A(omega))', fontsize=15)
-plt.title('Amplitude curve as a function of drive frequency', fontsize=15)
-plt.xticks(fontsize=14) # set font size for x-axis ticks
-plt.yticks(fontsize=14) # set font size for y-axis ticks
-plt.show()
+if __name__ == '__main__':
+ # Array of omega values
+ # Creates a list of 100 evenly spaced values between omega_min and omega_max
+ omega = np.linspace(omega_min, omega_max, 100)
+
+ # Defines the variable A_omega as the result of calling the function A with the argument omega.
+ A_omega = A(omega)
+
+ plot(omega, A_omega)
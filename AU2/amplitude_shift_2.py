@@ -1,5 +1,6 @@
 import numpy as np
-import matplotlib.pyplot as plt
+import resonance
+import plotting
 
 # Constants
 b = 1 # the amplitude of the driving force
@@ -18,26 +19,32 @@ def A(omega, c):
 omega_min = omega_0 - 1
 omega_max = omega_0 + 1
 
-# Array of omega values
-# Creates a list of 100 evenly spaced values between omega_min and omega_max
-omega = np.linspace(omega_min, omega_max, 100)
+def plot(omega):
+  plt, fastplot = plotting.load()
 
-# Loop through c_array to plot amplitude curves for each value of c
-for c in c_val:
+  # A is evaluated for all values of c at once, with omega along the rows and c along the columns
+  A_omega = A(omega[:, None], np.array(c_val)[None, :])
 
-  # Defines the variable A_omega as the result of calling the function A with the argument omega.
-  A_omega = A(omega, c)
+  # Plot the amplitude curve for each value of c
+  for i, c in enumerate(c_val):
+    fastplot.plot(omega, A_omega[:, i], label='c = ' + str(c))
 
-  # Plot the amplitude curve
-  plt.plot(omega, A_omega, label='c = ' + str(c))
-
-plt.legend(fontsize=15)
-plt.xlabel('Drive Frequency (omega)',fontsize=15)
-plt.ylabel('Amplitude (A(omega))',fontsize=15)
-plt.title('Change in amplitude caused by the damping coefficient',fontsize=15)
-plt.xticks(fontsize=14) # set font size for x-axis ticks
-plt.yticks(fontsize=14) # set font size for y-axis ticks
-plt.show()
+  plt.legend(fontsize=15)
+  plt.xlabel('Drive Frequency (omega)',fontsize=15)
+  plt.ylabel('Amplitude (A(omega))',fontsize=15)
+  plt.title('Change in amplitude caused by the damping coefficient',fontsize=15)
+  plt.xticks(fontsize=14) # set font size for x-axis ticks
+  plt.yticks(fontsize=14) # set font size for y-axis ticks
+  plt.show()
 
+if __name__ == '__main__':
+  # Array of omega values
+  # Creates a list of 100 evenly spaced values between omega_min and omega_max
+  omega = np.linspace(omega_min, omega_max, 100)
 
+  # The peaks are calculated directly, not read from the sampled curves
+  peaks = resonance.resonance(m, k, np.array(c_val), b)
+  for i, c in enumerate(c_val):
+    print('c = {}: peak at omega = {:.4f}, A = {:.4f}, Q = {:.3f}'.format(c, peaks['peak_omega'][i], peaks['peak_amplitude'][i], peaks['Q'][i]))
 
+  plot(omega)
@@ -1,10 +1,10 @@
 import numpy as np
-import matplotlib.pyplot as plt
+import integrator
+import solvers
+import plotting
 
 dt = 0.001
 tmax = 10
-t = np.arange(0,tmax,dt)
-dim = len(t)
 
 # Parametrar för numerisk lösning
 m = 1
@@ -15,34 +15,35 @@ w = 2.5
 w0 = np.sqrt(k/m)
 lam = c/(2*m)
 
-# Parametrar för analytisk lösning
-beta = np.sqrt(w0**2-lam**2)
-delt = np.radians(81.9106) 
-A = np.sqrt(1+((lam**2)/delt**2))
+# Analytic solution, see solvers.analytic. It has the form
+# A*exp(-lam*t)*sin(beta*t + delt), with A and delt given by x(0) = 1 and v(0) = 0
+def analytic(t):
+    return solvers.analytic(t, m, k, c, b, w, 1, 0)
 
-# Initialisera vektorer
-x = np.zeros(dim)
-v = np.zeros(dim)
-a = np.zeros(dim)
+# Numerical solution
+def simulate(out=None):
+    t = np.arange(0,tmax,dt)
 
-# Begynnelsevillkor
-x[0] = 1
-v[0] = 0
-a[0] = (-k*x[0] - c*v[0] + b*np.cos(w*t[0]))/m
+    # Begynnelsevillkor x0 = 1, v0 = 0. Tidsstegningen görs i integrator.py
+    x, v, a = integrator.euler(t, m, k, c, b, w, 1, 0, out=out)
 
-# Analytic solution
-xa = A*np.exp(-lam*t)*np.sin(beta*t+delt)
+    return t, x, v, a
 
-# Numerical solution
-for i in range(dim-1):
-    v[i+1] = v[i] + a[i]*dt
-    x[i+1] = x[i] + v[i]*dt
-    a[i+1] = (-k*x[i+1] -c*v[i+1] + b*np.cos(w*t[i+1]))/m
-
-plt.plot(t, x, label='Numerical Solution')
-plt.plot(t, xa, label='Analytical Solution')
-plt.xlabel('Time (t)')
-plt.ylabel('Displacement (x)')
-plt.legend()
-plt.title('Comparison of Analytical and Numerical Solutions')
-plt.show()
\ No newline at end of file
+def plot(t, x, xa):
+    plt, fastplot = plotting.load()
+
+    fastplot.plot(t, x, label='Numerical Solution')
+    fastplot.plot(t, xa, label='Analytical Solution')
+    plt.xlabel('Time (t)')
+    plt.ylabel('Displacement (x)')
+    plt.legend()
+    plt.title('Comparison of Analytical and Numerical Solutions')
+    plt.show()
+
+if __name__ == '__main__':
+    # Steps needed and error of the different solvers compared to the analytic solution
+    for run in solvers.error_report(m, k, c, b, w, 1, 0, tmax):
+        print(run)
+
+    t, x, v, a = simulate()
+    plot(t, x, analytic(t))
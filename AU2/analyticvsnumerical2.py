@@ -1,10 +1,10 @@
 import numpy as np
-import matplotlib.pyplot as plt
+import integrator
+import steady_state
+import plotting
 
 dt = 0.0001
 tmax = 200
-t = np.arange(0,tmax,dt)
-dim = len(t)
 
 # Parametrar för numerisk lösning
 m = 1
@@ -15,28 +15,46 @@ w = 2
 w0 = np.sqrt(k/m)
 lam = c/(2*m)
 
-# Initialisera vektorer
-x = np.zeros(dim)
-v = np.zeros(dim)
-a = np.zeros(dim)
+# Numerical solution
+def simulate(out=None):
+    t = np.arange(0,tmax,dt)
 
-# Begynnelsevillkor
-x[0] = 1
-v[0] = 0
-a[0] = (-k*x[0] - c*v[0] + b*np.cos(w*t[0]))/m 
+    # Begynnelsevillkor x0 = 1, v0 = 0. Tidsstegningen görs i integrator.py
+    x, v, a = integrator.euler(t, m, k, c, b, w, 1, 0, out=out)
 
-# Numerical solution
-for i in range(dim-1):
-    v[i+1] = v[i] + a[i]*dt
-    x[i+1] = x[i] + v[i]*dt
-    a[i+1] = (-k*x[i+1] -c*v[i+1] + b*np.cos(w*t[i+1]))/m 
-    a =V(t) * (L - 1 / (ω * C) )
-
-plt.plot(t, x, label='Numerical Solution')
-plt.legend(fontsize=15)
-plt.xlabel('Time (t)',fontsize=15)
-plt.ylabel('Displacement (x)',fontsize=15)
-plt.title('From transient to stationary',fontsize=15)
-plt.xticks(fontsize=14) # set font size for x-axis ticks
-plt.yticks(fontsize=14) # set font size for y-axis ticks
-plt.show()
+    return t, x, v, a
+
+# Streamed numerical solution, see integrator.run_stream. Only every
+# record_every:th step and the min/max envelope of x are kept, so the memory use
+# stays the same for any tmax. With path set, x and v are also written to a .npy file
+def simulate_stream(record_every=100, envelope=1000, path=None):
+    return integrator.run_stream(tmax, dt, m, k, c, b, w, 1, 0, record_every=record_every, envelope=envelope, path=path)
+
+# Runs only until the amplitude and phase of x have stopped changing, see
+# steady_state.run_until_steady, and compares them with the analytic A(omega)
+def simulate_until_steady(tol=1e-3):
+    return steady_state.run_until_steady(m, k, c, b, w, 1, 0, dt, tmax, tol=tol)
+
+def plot(t, x):
+    plt, fastplot = plotting.load()
+
+    fastplot.plot(t, x, label='Numerical Solution')
+    plt.legend(fontsize=15)
+    plt.xlabel('Time (t)',fontsize=15)
+    plt.ylabel('Displacement (x)',fontsize=15)
+    plt.title('From transient to stationary',fontsize=15)
+    plt.xticks(fontsize=14) # set font size for x-axis ticks
+    plt.yticks(fontsize=14) # set font size for y-axis ticks
+    plt.show()
+
+if __name__ == '__main__':
+    steady = simulate_until_steady()
+    if steady['converged']:
+        print('Stationary after t = {:.1f} ({} steps)'.format(steady['settling_time'], steady['steps']))
+    else:
+        print('Not stationary before tmax = {}'.format(tmax))
+    print('Amplitude {:.5f} (analytic {:.5f}), phase {:.4f} (analytic {:.4f})'.format(
+        steady['amplitude'], steady['analytic_amplitude'], steady['phase'], steady['analytic_phase']))
+
+    t, x, v, a = simulate()
+    plot(t, x)
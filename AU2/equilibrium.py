@@ -1,5 +1,6 @@
 import numpy as np
-import matplotlib.pyplot as plt
+import integrator
+import plotting
 
 # Constants
 m = 1 # the mass of the oscillator
@@ -13,34 +14,33 @@ v0 = 0 # the initial velocity of the oscillator
 # Time
 T = 10 # the total time of the simulation
 dt = 0.001 # time step
-t = np.arange(0, T, dt) # arange(start, stop, step) 
+t = np.arange(0, T, dt) # arange(start, stop, step)
 
 # Euler's method
 def euler(x, v, t, c):
-    # The function initializes two arrays, x_new and v_new, 
-    # to store the values of the displacement and velocity of the oscillator at each time step.
-    x_new = np.zeros(len(t))
-    v_new = np.zeros(len(t))
-    x_new[0] = x0
-    v_new[0] = v0
-
-    # Start at 1. For every i in the length of t, iteratively 
-    # calculate the new values of x and v using Euler's method and 
-    # store them in the x_new and v_new arrays
-    for i in range(1, len(t)):
-        x_new[i] = x_new[i-1] + v_new[i-1]*dt
-        v_new[i] = v_new[i-1] - (k/m)*x_new[i-1]*dt - (c/m)*v_new[i-1]*dt
+    # The time stepping is done by the shared Euler integrator in integrator.py,
+    # with no driving force (b = 0). It calculates the displacement and velocity
+    # of the oscillator at each time step, starting from x0 and v0.
+    x_new, v_new, a_new = integrator.euler(t, m, k, c, 0, 0, x0, v0)
     return x_new, v_new
 
-for value in c:
-    x, v = euler(x0, v0, t, value)
-    plt.plot(t, x, label='c={}'.format(value))
-
 # Plot
-plt.legend(fontsize=15)
-plt.xlabel('Time (t)', fontsize=15) # set font size for x-axis label
-plt.ylabel('Displacement (x)', fontsize=15) # set font size for y-axis label
-plt.xticks(fontsize=14) # set font size for x-axis ticks
-plt.yticks(fontsize=14) # set font size for y-axis ticks
+def plot(t, results):
+    plt, fastplot = plotting.load()
+
+    for value, x in results:
+        fastplot.plot(t, x, label='c={}'.format(value))
+
+    plt.legend(fontsize=15)
+    plt.xlabel('Time (t)', fontsize=15) # set font size for x-axis label
+    plt.ylabel('Displacement (x)', fontsize=15) # set font size for y-axis label
+    plt.xticks(fontsize=14) # set font size for x-axis ticks
+    plt.yticks(fontsize=14) # set font size for y-axis ticks
+
+    plt.show()
+
+if __name__ == '__main__':
+    # All damping coefficients are simulated together as one batch
+    x, v = integrator.euler_batch(t, m, k, c, 0, 0, x0, v0)
 
-plt.show()
+    plot(t, zip(c, x.T))
@@ -0,0 +1,250 @@
+import os
+import numpy as np
+
+# Shared time stepping for the damped, driven oscillator
+#
+#   m*x'' + c*x' + k*x = b*cos(w*t)
+#
+# used by analyticvsnumerical1.py, analyticvsnumerical2.py and equilibrium.py.
+#
+# The driving force is evaluated for all time steps at once, and the Euler
+# recurrence runs in a Numba compiled loop when Numba is installed. Without
+# Numba (or with AU2_NO_JIT=1) a plain Python loop over floats is used. Numba is
+# only imported on the first call, so importing this module stays cheap.
+
+_kernel = None
+
+# Driving force b*cos(w*t) for every time step
+def forcing(t, b, w, out=None):
+    out = np.multiply(w, t, out=out)
+    np.cos(out, out=out)
+    out *= b
+    return out
+
+# Forward Euler, the same recurrence as the original loops:
+#   v[i+1] = v[i] + a[i]*dt
+#   x[i+1] = x[i] + v[i]*dt
+#   a[i+1] = (-k*x[i+1] - c*v[i+1] + f[i+1])/m
+# a holds the driving force f on entry and the acceleration on return.
+def _euler_loop(x, v, a, dt, m, k, c):
+    a[0] = (-k*x[0] - c*v[0] + a[0])/m
+    for i in range(len(x)-1):
+        v[i+1] = v[i] + a[i]*dt
+        x[i+1] = x[i] + v[i]*dt
+        a[i+1] = (-k*x[i+1] - c*v[i+1] + a[i+1])/m
+
+# Fallback without Numba: the same loop on Python floats, which avoids the
+# NumPy scalar overhead of indexing the arrays in every step
+def _euler_python(x, v, a, dt, m, k, c):
+    f = a.tolist()
+    xi = float(x[0])
+    vi = float(v[0])
+    ai = (-k*xi - c*vi + f[0])/m
+
+    xs = [xi]
+    vs = [vi]
+    accs = [ai]
+    for fi in f[1:]:
+        xi, vi = xi + vi*dt, vi + ai*dt
+        ai = (-k*xi - c*vi + fi)/m
+        xs.append(xi)
+        vs.append(vi)
+        accs.append(ai)
+
+    x[:] = xs
+    v[:] = vs
+    a[:] = accs
+
+def _get_kernel():
+    global _kernel
+    if _kernel is None:
+        _kernel = _euler_python
+        if os.environ.get('AU2_NO_JIT', '0') == '0':
+            try:
+                from numba import njit
+            except ImportError:
+                pass
+            else:
+                _kernel = njit(cache=True)(_euler_loop)
+    return _kernel
+
+# Preallocated x, v, a buffers for n time steps, to pass as out= to euler
+def allocate(n):
+    return np.empty(n), np.empty(n), np.empty(n)
+
+def euler(t, m, k, c, b, w, x0, v0, out=None):
+    """
+    Integrates the oscillator with forward Euler over the equally spaced times t.
+
+    out can be a tuple of three preallocated arrays (x, v, a) of the same
+    length as t, which are then filled and returned instead of new arrays.
+
+    Returns x, v, a.
+    """
+    dt = t[1] - t[0]
+    x, v, a = allocate(len(t)) if out is None else out
+
+    x[0] = x0
+    v[0] = v0
+    forcing(t, b, w, out=a)
+
+    _get_kernel()(x, v, a, dt, m, k, c)
+    return x, v, a
+
+# Streaming
+#
+# For long runs the time steps are calculated in chunks of a fixed size that
+# reuse the same buffers, so the memory use does not depend on tmax. The state
+# at the end of a chunk is carried over with one Euler step into the first
+# element of the next, which gives exactly the same values as one long run.
+
+# Number of elements in np.arange(0, tmax, dt), without allocating it
+def _steps(tmax, dt):
+    return max(0, int(np.ceil(tmax/dt)))
+
+def stream(tmax, dt, m, k, c, b, w, x0, v0, chunk_size=2**16):
+    """
+    Integrates the oscillator like euler(np.arange(0, tmax, dt), ...), but
+    yields the result as chunks (start, t, x, v, a) of at most chunk_size time
+    steps, where start is the index of the first step in the chunk.
+
+    The arrays are reused between chunks, so they are only valid until the next
+    chunk is requested. Copy them to keep them.
+    """
+    n = _steps(tmax, dt)
+    kernel = _get_kernel()
+    t_buf, x_buf, v_buf, a_buf = np.empty(chunk_size), *allocate(chunk_size)
+
+    # The state of the first step in the next chunk
+    x_next, v_next = x0, v0
+
+    for start in range(0, n, chunk_size):
+        size = min(chunk_size, n - start)
+        t, x, v, a = t_buf[:size], x_buf[:size], v_buf[:size], a_buf[:size]
+
+        # The same times as np.arange(0, tmax, dt)
+        np.multiply(np.arange(start, start + size), dt, out=t)
+
+        x[0] = x_next
+        v[0] = v_next
+
+        forcing(t, b, w, out=a)
+        kernel(x, v, a, dt, m, k, c)
+
+        # One Euler step from the last element
+        x_last, v_last, a_last = float(x[-1]), float(v[-1]), float(a[-1])
+        x_next = x_last + v_last*dt
+        v_next = v_last + a_last*dt
+
+        yield start, t, x, v, a
+
+def run_stream(tmax, dt, m, k, c, b, w, x0, v0, chunk_size=2**16, record_every=None, envelope=None, path=None, callback=None):
+    """
+    Runs stream() and reduces the chunks as they are calculated, so only the
+    reduced result is kept in memory:
+
+        record_every    keep every record_every:th step of t and x
+        envelope        the min and max of x in blocks of envelope steps
+        path            write x and v as columns to a memory mapped .npy file
+        callback        called with (start, t, x, v, a) for every chunk
+
+    The largest |x| so far is always tracked. Returns a dict with steps,
+    max_amplitude and, depending on the options, t and x, envelope_t,
+    envelope_min and envelope_max, and path.
+    """
+    if envelope is not None:
+        # Whole blocks in every chunk except the last
+        chunk_size = -(-chunk_size//envelope)*envelope
+
+    n = _steps(tmax, dt)
+    result = {'steps': n, 'max_amplitude': 0.0}
+
+    records = []
+    blocks = []
+    memmap = None
+    if path is not None:
+        memmap = np.lib.format.open_memmap(path, mode='w+', dtype=float, shape=(n, 2))
+        result['path'] = path
+
+    for start, t, x, v, a in stream(tmax, dt, m, k, c, b, w, x0, v0, chunk_size):
+        if len(x):
+            result['max_amplitude'] = max(result['max_amplitude'], float(np.max(np.abs(x))))
+
+        if record_every is not None:
+            offset = -start % record_every
+            records.append((t[offset::record_every].copy(), x[offset::record_every].copy()))
+
+        if envelope is not None:
+            edges = np.arange(0, len(x), envelope)
+            blocks.append((t[edges].copy(), np.minimum.reduceat(x, edges), np.maximum.reduceat(x, edges)))
+
+        if memmap is not None:
+            memmap[start:start + len(x), 0] = x
+            memmap[start:start + len(x), 1] = v
+
+        if callback is not None:
+            callback(start, t, x, v, a)
+
+    if memmap is not None:
+        memmap.flush()
+        del memmap
+
+    if record_every is not None:
+        result['t'] = np.concatenate([r[0] for r in records]) if records else np.empty(0)
+        result['x'] = np.concatenate([r[1] for r in records]) if records else np.empty(0)
+
+    if envelope is not None:
+        for i, key in enumerate(('envelope_t', 'envelope_min', 'envelope_max')):
+            result[key] = np.concatenate([block[i] for block in blocks]) if blocks else np.empty(0)
+
+    return result
+
+# Advances all configurations together, one vectorized Euler step at a time
+def _euler_batch(t, m, k, c, b, w, x0, v0, record_every):
+    dt = t[1] - t[0]
+    n_records = (len(t) - 1)//record_every + 1
+    xs = np.empty((n_records, len(m)))
+    vs = np.empty((n_records, len(m)))
+
+    driven = np.any(b != 0)
+    x = x0.copy()
+    v = v0.copy()
+    a = (-k*x - c*v + (b*np.cos(w*t[0]) if driven else 0))/m
+    xs[0] = x
+    vs[0] = v
+
+    for i in range(1, len(t)):
+        x, v = x + v*dt, v + a*dt
+        a = (-k*x - c*v + (b*np.cos(w*t[i]) if driven else 0))/m
+        if i % record_every == 0:
+            xs[i//record_every] = x
+            vs[i//record_every] = v
+
+    return xs, vs
+
+def euler_batch(t, m, k, c, b, w, x0, v0, record_every=1, workers=None):
+    """
+    Forward Euler for many configurations at once. m, k, c, b, w, x0 and v0 can
+    be numbers or arrays, and are broadcast to one value per configuration.
+    Every time step updates the (n_configs,) state with one vectorized
+    operation, instead of running one Python loop per configuration.
+
+    Only every record_every:th step is stored. With workers set, the
+    configurations are split over that many processes.
+
+    Returns x and v with shape (n_records, n_configs).
+    """
+    params = np.broadcast_arrays(*[np.atleast_1d(np.asarray(p, dtype=float)) for p in (m, k, c, b, w, x0, v0)])
+    params = [p.ravel() for p in params]
+
+    if workers is None:
+        return _euler_batch(t, *params, record_every)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunks = np.array_split(np.arange(len(params[0])), workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_euler_batch, t, *[p[chunk] for p in params], record_every) for chunk in chunks if len(chunk)]
+        results = [future.result() for future in futures]
+
+    return np.concatenate([xs for xs, vs in results], axis=1), np.concatenate([vs for xs, vs in results], axis=1)
@@ -0,0 +1,30 @@
+import importlib
+import importlib.util
+import os
+import sys
+
+# Plotting for the AU2 scripts
+#
+# matplotlib and the shared plotting in common/fastplot.py are only imported
+# when something is plotted, so the scripts can be imported and their compute
+# functions used without a plot window.
+#
+# common/ is found from the repository root next to this folder and imported
+# as fy122a_common, so the plot() functions work for importers that do not have
+# the root on sys.path, or that have another package called common.
+
+def _common(name):
+    if 'fy122a_common' not in sys.modules:
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common')
+        spec = importlib.util.spec_from_file_location('fy122a_common', os.path.join(root, '__init__.py'),
+                                                      submodule_search_locations=[root])
+        sys.modules['fy122a_common'] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sys.modules['fy122a_common'])
+    return importlib.import_module('fy122a_common.' + name)
+
+def load():
+    """
+    matplotlib.pyplot and common/fastplot.py, for the plot() functions.
+    """
+    import matplotlib.pyplot as plt
+    return plt, _common('fastplot')
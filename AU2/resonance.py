@@ -0,0 +1,99 @@
+import numpy as np
+
+# Resonance analysis for the driven, damped oscillator
+#
+#   m*x'' + c*x' + k*x = b*cos(omega*t)
+#
+# with the stationary amplitude A(omega) from amplitude_shift.py. All functions
+# broadcast over their arguments, so whole (omega x c x k x m) grids can be
+# evaluated at once, e.g. resonance(m[None, None, :], k[None, :, None], c[:, None, None]).
+
+# A(omega), the same formula as in amplitude_shift.py, with omega_0**2 = k/m
+def amplitude(omega, m, k, c, b=1):
+    return b/np.sqrt(m**2 * (omega**2 - k/m)**2 + c**2 * omega**2)
+
+def iter_amplitude(omega, m, k, c, b=1, max_elements=2**22):
+    """
+    Evaluates A(omega) for every combination of the values in m, k and c, in
+    chunks of at most max_elements values so the memory use stays bounded.
+
+    Yields (index, A) where index are the flat indices into the (m, k, c) grid
+    (shape (len(m), len(k), len(c))) and A has shape (len(index), len(omega)).
+    """
+    omega = np.asarray(omega, dtype=float)
+    m, k, c = [g.ravel() for g in np.meshgrid(np.atleast_1d(m), np.atleast_1d(k), np.atleast_1d(c), indexing='ij')]
+
+    step = max(1, max_elements//max(1, len(omega)))
+    for start in range(0, len(m), step):
+        index = np.arange(start, min(start + step, len(m)))
+        yield index, amplitude(omega[None, :], m[index, None], k[index, None], c[index, None], b)
+
+# The squared denominator of A(omega), and its derivative with respect to omega
+def _denominator(omega, m, k, c):
+    return (m*omega**2 - k)**2 + c**2 * omega**2
+
+def _denominator_derivative(omega, m, k, c):
+    return 4*m*omega*(m*omega**2 - k) + 2*c**2 * omega
+
+# Newton steps on D(omega) = target, only where omega > 0
+def _refine(omega, target, m, k, c, steps):
+    for _ in range(steps):
+        slope = _denominator_derivative(omega, m, k, c)
+        refine = (omega > 0) & (slope != 0)
+        omega = omega - np.where(refine, (_denominator(omega, m, k, c) - target)/np.where(refine, slope, 1.0), 0.0)
+    return omega
+
+def resonance(m, k, c, b=1, newton_steps=2):
+    """
+    Peak frequency, peak amplitude, half-power frequencies, bandwidth and Q of
+    A(omega), from closed form expressions instead of sampling the curve.
+
+    With u = omega**2 the squared denominator of A is a quadratic in u:
+
+        peak:       u_peak = k/m - c**2/(2*m**2)  (the peak is at omega = 0 if this is <= 0)
+        half power: the roots of D(u) = 2*D(u_peak)
+
+    The smaller root is taken from the product of the roots, so it does not lose
+    precision when the roots are far apart. The half-power frequencies are then
+    refined with a few vectorized Newton steps on D(omega) - 2*D_peak, and the
+    bandwidth is calculated as (u_high - u_low)/(omega_high + omega_low), which
+    does not lose precision for light damping where the two are almost equal.
+
+    Returns a dict of arrays broadcast over m, k, c and b: peak_omega,
+    peak_amplitude, omega_low, omega_high, bandwidth and Q (peak_omega/bandwidth).
+    """
+    m, k, c, b = np.broadcast_arrays(*[np.asarray(p, dtype=float) for p in (m, k, c, b)])
+
+    u_peak = k/m - c**2/(2*m**2)
+    peaked = u_peak > 0
+    u_peak = np.where(peaked, u_peak, 0.0)
+    peak_omega = np.sqrt(u_peak)
+
+    D_peak = np.where(peaked, c**2 * (k/m - c**2/(4*m**2)), k**2)
+    peak_amplitude = b/np.sqrt(D_peak)
+
+    # m**2*u**2 + (c**2 - 2*m*k)*u + k**2 - 2*D_peak = 0. The square root of the
+    # discriminant is simplified by hand, since it is a small difference of two
+    # large terms when the damping is light
+    root_spread = np.where(peaked,
+        c*np.sqrt(np.maximum(4*m*k - c**2, 0.0)),
+        np.sqrt((c**2 - 2*m*k)**2 + 4*m**2 * k**2))
+    u_high = ((2*m*k - c**2) + root_spread)/(2*m**2)
+    u_low = (k**2 - 2*D_peak)/(m**2 * u_high)
+
+    omega_high = np.sqrt(u_high)
+    omega_low = np.sqrt(np.maximum(u_low, 0.0))
+
+    omega_high = _refine(omega_high, 2*D_peak, m, k, c, newton_steps)
+    omega_low = _refine(omega_low, 2*D_peak, m, k, c, newton_steps)
+
+    bandwidth = np.where(u_low > 0, (root_spread/m**2)/(omega_high + omega_low), omega_high)
+
+    return {
+        'peak_omega': peak_omega,
+        'peak_amplitude': peak_amplitude,
+        'omega_low': np.where(u_low > 0, omega_low, 0.0),
+        'omega_high': omega_high,
+        'bandwidth': bandwidth,
+        'Q': peak_omega/bandwidth,
+    }
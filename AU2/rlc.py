@@ -1,24 +1,182 @@
 import numpy as np
-import matplotlib.pyplot as plt
+import plotting
 
 #R = 5
 R = 500
 L = 8.2e-3
 C = 100e-6
 
-f = np.logspace(0, 6, num=1000) # generates an array of 1000 values between 10^0 and 10^6 (inclusive) on a logarithmic scale
-omega = 2*np.pi*f # calculates the angular frequency in radians per second (rad/s)
+def frequency_response(f):
+    omega = 2*np.pi*f # calculates the angular frequency in radians per second (rad/s)
 
-Z_R = R # assigns the value of R to the variable Z_R, which represents the impedance of the resistor
-Z_L = 1j*omega*L # calculates the impedance of the inductor using the formula Z_L = jωL, where j is the imaginary unit (sqrt(-1)) and ω is the angular frequency.
-Z_C = 1/(1j*omega*C) # calculates the impedance of the capacitor using the formula Z_C = 1/(jωC)
+    Z_R = R # assigns the value of R to the variable Z_R, which represents the impedance of the resistor
+    Z_L = 1j*omega*L # calculates the impedance of the inductor using the formula Z_L = jωL, where j is the imaginary unit (sqrt(-1)) and ω is the angular frequency.
+    Z_C = 1/(1j*omega*C) # calculates the impedance of the capacitor using the formula Z_C = 1/(jωC)
 
-Z = Z_R + Z_L + Z_C # calculates the total impedance of the circuit by summing the impedances of the resistor, inductor, and capacitor
-H = Z_C / Z # calculates the transfer function of the circuit, which represents the ratio of the output voltage to the input voltage. The transfer function is equal to the impedance of the capacitor divided by the total impedance of the circuit
+    Z = Z_R + Z_L + Z_C # calculates the total impedance of the circuit by summing the impedances of the resistor, inductor, and capacitor
+    H = Z_C / Z # calculates the transfer function of the circuit, which represents the ratio of the output voltage to the input voltage. The transfer function is equal to the impedance of the capacitor divided by the total impedance of the circuit
+    return H
 
-plt.semilogx(f, 20*np.log10(np.abs(H)))
-plt.xlabel('Frekvens (Hz)')
-plt.ylabel('Amplitudförstärkning (dB)')
-plt.title('Frekvensrespons för RLC-lågpassfilter')
-plt.grid()
-plt.show()
\ No newline at end of file
+# Batch evaluation
+#
+# Z_C/Z simplifies to H = 1/(1 - omega**2*L*C + j*omega*R*C), so the transfer
+# function of many circuits can be calculated at once by broadcasting f, R, L
+# and C against each other, e.g. transfer_function(f[None, :], R[:, None], L[:, None], C[:, None]).
+
+def transfer_function(f, R=R, L=L, C=C, dtype=np.complex128, out=None):
+    """
+    H for every combination of f, R, L and C, broadcast against each other.
+
+    The result is written in place into out if it is given (it must have the
+    broadcast shape), otherwise into a new array of the given dtype. With
+    dtype=np.complex64 the result takes half the memory.
+    """
+    omega = 2*np.pi*np.asarray(f, dtype=float)
+    if out is None:
+        out = np.empty(np.broadcast_shapes(np.shape(omega), np.shape(R), np.shape(L), np.shape(C)), dtype=dtype)
+
+    # The real and imaginary parts of the denominator are written directly into out
+    re = out.real
+    im = out.imag
+    np.multiply(omega, C, out=re)
+    re *= L
+    re *= omega
+    np.subtract(1, re, out=re)
+    np.multiply(omega, C, out=im)
+    im *= R
+    np.reciprocal(out, out=out)
+    return out
+
+def gain_db(H, out=None):
+    out = np.abs(H, out=out)
+    np.log10(out, out=out)
+    out *= 20
+    return out
+
+def gain_envelope(f, R, L, C, dtype=np.complex64, chunk_size=2**20):
+    """
+    The lowest and highest gain in dB at every frequency in f, over all circuits
+    given by the (equally long) arrays R, L and C.
+
+    The circuits are evaluated in chunks that reuse the same buffers, so the
+    memory use depends on chunk_size and not on the number of circuits.
+
+    Returns (min_db, max_db), each with the same length as f.
+    """
+    f = np.asarray(f, dtype=float)
+    R, L, C = [np.ravel(p) for p in np.broadcast_arrays(R, L, C)]
+    rows = max(1, chunk_size//len(f))
+
+    H = np.empty((rows, len(f)), dtype=dtype)
+    db = np.empty((rows, len(f)), dtype=H.real.dtype)
+    min_db = np.full(len(f), np.inf)
+    max_db = np.full(len(f), -np.inf)
+
+    for start in range(0, len(R), rows):
+        n = min(rows, len(R) - start)
+        chunk = slice(start, start + n)
+        transfer_function(f[None, :], R[chunk, None], L[chunk, None], C[chunk, None], out=H[:n])
+        gain_db(H[:n], out=db[:n])
+        np.minimum(min_db, db[:n].min(axis=0), out=min_db)
+        np.maximum(max_db, db[:n].max(axis=0), out=max_db)
+
+    return min_db, max_db
+
+def characteristics(R=R, L=L, C=C):
+    """
+    Cutoff, resonance and phase margin of the filter for every combination of R,
+    L and C, from closed form expressions instead of a sampled curve.
+
+    With u = omega**2, |H|**-2 = (L*C)**2*u**2 + ((R*C)**2 - 2*L*C)*u + 1, so
+
+        -3 dB cutoff:   the positive root of |H|**-2 = 2
+        resonance:      u = 1/(L*C) - R**2/(2*L**2), if it is positive
+        unity gain:     u = 2/(L*C) - R**2/L**2, if it is positive
+
+    The phase margin is 180 degrees plus the phase of H where |H| = 1. If the
+    gain never reaches 1 above 0 Hz there is no crossover, and the crossover
+    frequency and phase margin are nan.
+
+    Returns a dict of arrays with the frequencies in Hz: cutoff, resonance
+    (0 if there is no peak), peak_db, Q, crossover and phase_margin (degrees).
+    """
+    R, L, C = np.broadcast_arrays(*[np.asarray(p, dtype=float) for p in (R, L, C)])
+    LC = L*C
+    RC = R*C
+
+    # a*u**2 + b*u - 1 = 0 has exactly one positive root. It is calculated as
+    # 2/(b + sqrt(b**2 + 4*a)), which does not cancel when b is large.
+    a = LC**2
+    b = RC**2 - 2*LC
+    sq = np.sqrt(b**2 + 4*a)
+    u_cutoff = np.where(b > 0, 2/(b + sq), (sq - b)/(2*a))
+
+    u_peak = 1/LC - R**2/(2*L**2)
+    peaked = u_peak > 0
+    u_peak = np.where(peaked, u_peak, 0.0)
+    peak_db = 10*np.log10(1/(a*u_peak**2 + b*u_peak + 1))
+
+    u_cross = 2/LC - R**2/L**2
+    crossing = u_cross > 0
+    omega_cross = np.sqrt(np.where(crossing, u_cross, np.nan))
+    phase = -np.arctan2(omega_cross*RC, 1 - omega_cross**2*LC)
+
+    return {
+        'cutoff': np.sqrt(u_cutoff)/(2*np.pi),
+        'resonance': np.sqrt(u_peak)/(2*np.pi),
+        'peak_db': peak_db,
+        'Q': np.sqrt(L/C)/R,
+        'crossover': omega_cross/(2*np.pi),
+        'phase_margin': 180 + np.degrees(phase),
+    }
+
+def tolerance_samples(n, R=R, L=L, C=C, tolerance=(0.05, 0.1, 0.2), rng=None):
+    """
+    n random circuits with every component uniformly within its tolerance of the
+    nominal value, e.g. tolerance=(0.05, 0.1, 0.2) for 5 % R, 10 % L and 20 % C.
+
+    All random numbers are drawn from rng, a np.random.Generator, so a seeded rng
+    gives the same circuits. Returns R, L and C as arrays of length n.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    return tuple(value*(1 + rng.uniform(-tol, tol, size=n)) for value, tol in zip((R, L, C), tolerance))
+
+def tolerance_analysis(n, f=None, tolerance=(0.05, 0.1, 0.2), rng=None, dtype=np.complex64):
+    """
+    Monte Carlo tolerance analysis of the filter: characteristics() for n random
+    circuits from tolerance_samples(), with the 10th, 50th and 90th percentile of
+    each value (nan where the value does not exist is ignored).
+
+    If f is given, the gain envelope over all circuits is calculated as well.
+    """
+    R_s, L_s, C_s = tolerance_samples(n, tolerance=tolerance, rng=rng)
+    result = characteristics(R_s, L_s, C_s)
+
+    percentiles = {}
+    for key, values in result.items():
+        percentiles[key] = np.nanpercentile(values, [10, 50, 90]) if np.any(np.isfinite(values)) else np.full(3, np.nan)
+    result['percentiles'] = percentiles
+
+    if f is not None:
+        result['envelope'] = gain_envelope(f, R_s, L_s, C_s, dtype=dtype)
+    return result
+
+def plot(f, H, envelope=None):
+    plt, fastplot = plotting.load()
+
+    fastplot.semilogx(f, 20*np.log10(np.abs(H)))
+    if envelope is not None:
+        fastplot.fill_between(f, envelope[0], envelope[1], alpha=0.3)
+    plt.xlabel('Frekvens (Hz)')
+    plt.ylabel('Amplitudförstärkning (dB)')
+    plt.title('Frekvensrespons för RLC-lågpassfilter')
+    plt.grid()
+    plt.show()
+
+if __name__ == '__main__':
+    f = np.logspace(0, 6, num=1000) # generates an array of 1000 values between 10^0 and 10^6 (inclusive) on a logarithmic scale
+
+    result = characteristics()
+    print('Brytfrekvens (-3 dB): {:.1f} Hz'.format(float(result['cutoff'])))
+
+    plot(f, frequency_response(f))
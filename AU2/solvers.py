@@ -0,0 +1,180 @@
+import numpy as np
+import integrator
+
+# Higher order and adaptive solvers for the damped, driven oscillator
+#
+#   m*x'' + c*x' + k*x = b*cos(w*t)
+#
+# All solvers use the same right-hand side from oscillator(), and report how
+# many steps and right-hand side evaluations they needed, so they can be
+# compared with the Euler loops (integrator.py) at equal accuracy.
+
+# Right-hand side of the oscillator as a first order system: (x', v')
+def oscillator(m, k, c, b, w):
+    def rhs(t, x, v):
+        return v, (-k*x - c*v + b*np.cos(w*t))/m
+    return rhs
+
+# Exact solution for an underdamped oscillator (c**2 < 4*k*m): the decaying
+# transient plus the stationary oscillation A(w)*cos(w*t - phi), with A(w) as in
+# amplitude_shift.py. With b = 0 this is the solution in analyticvsnumerical1.py.
+def analytic(t, m, k, c, b, w, x0, v0):
+    w0 = np.sqrt(k/m)
+    lam = c/(2*m)
+    beta = np.sqrt(w0**2 - lam**2)
+
+    A = b/np.sqrt(m**2 * (w**2 - w0**2)**2 + c**2 * w**2)
+    phi = np.arctan2(c*w, m*(w0**2 - w**2))
+
+    # Constants of the transient from the initial conditions
+    C1 = x0 - A*np.cos(-phi)
+    C2 = (v0 + A*w*np.sin(-phi) + lam*C1)/beta
+
+    return np.exp(-lam*t)*(C1*np.cos(beta*t) + C2*np.sin(beta*t)) + A*np.cos(w*t - phi)
+
+# Classic fourth order Runge-Kutta with the fixed time steps in t
+def rk4(rhs, t, x0, v0):
+    n = len(t)
+    x = np.empty(n)
+    v = np.empty(n)
+    x[0] = x0
+    v[0] = v0
+
+    xi, vi = x0, v0
+    for i in range(n-1):
+        ti = t[i]
+        dt = t[i+1] - ti
+
+        k1x, k1v = rhs(ti, xi, vi)
+        k2x, k2v = rhs(ti + dt/2, xi + k1x*dt/2, vi + k1v*dt/2)
+        k3x, k3v = rhs(ti + dt/2, xi + k2x*dt/2, vi + k2v*dt/2)
+        k4x, k4v = rhs(ti + dt, xi + k3x*dt, vi + k3v*dt)
+
+        xi = xi + dt/6*(k1x + 2*k2x + 2*k3x + k4x)
+        vi = vi + dt/6*(k1v + 2*k2v + 2*k3v + k4v)
+        x[i+1] = xi
+        v[i+1] = vi
+
+    return x, v, {'steps': n-1, 'evaluations': 4*(n-1)}
+
+# Velocity Verlet with the fixed time steps in t. It is symplectic when there is
+# no damping (c = 0), so the energy does not drift like it does with Euler. The
+# damping term needs the new velocity, which is predicted with an Euler step.
+def verlet(rhs, t, x0, v0):
+    n = len(t)
+    x = np.empty(n)
+    v = np.empty(n)
+    x[0] = x0
+    v[0] = v0
+
+    xi, vi = x0, v0
+    ai = rhs(t[0], xi, vi)[1]
+    for i in range(n-1):
+        dt = t[i+1] - t[i]
+
+        xi = xi + vi*dt + ai*dt**2/2
+        v_half = vi + ai*dt/2
+        a_new = rhs(t[i+1], xi, vi + ai*dt)[1]
+        vi = v_half + a_new*dt/2
+        ai = a_new
+
+        x[i+1] = xi
+        v[i+1] = vi
+
+    return x, v, {'steps': n-1, 'evaluations': n}
+
+# Dormand-Prince 5(4) coefficients
+_DP_C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1, 1])
+_DP_A = [
+    [],
+    [1/5],
+    [3/40, 9/40],
+    [44/45, -56/15, 32/9],
+    [19372/6561, -25360/2187, 64448/6561, -212/729],
+    [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+    [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84],
+]
+# Difference between the fifth and fourth order weights, gives the error estimate
+_DP_E = np.array([71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40])
+
+def rk45(rhs, t0, tmax, x0, v0, rtol=1e-6, atol=1e-9, dt=None):
+    """
+    Adaptive Dormand-Prince 5(4) Runge-Kutta with error control.
+
+    The step is made larger or smaller so the estimated local error stays below
+    atol + rtol*|y| for both x and v. Returns the accepted times, x and v, and a
+    dict with the number of accepted and rejected steps and rhs evaluations.
+    """
+    def f(ti, y):
+        return np.array(rhs(ti, y[0], y[1]))
+
+    y = np.array([x0, v0], dtype=float)
+    ti = t0
+    dt = (tmax - t0)/100 if dt is None else dt
+
+    ts = [ti]
+    ys = [y]
+    accepted = 0
+    rejected = 0
+    k = [f(ti, y)] + [None]*6
+    evaluations = 1
+
+    while ti < tmax:
+        dt = min(dt, tmax - ti)
+
+        for s in range(1, 7):
+            ys_stage = y + dt*sum(a*ki for a, ki in zip(_DP_A[s], k))
+            k[s] = f(ti + _DP_C[s]*dt, ys_stage)
+        evaluations += 6
+
+        # The last stage is evaluated at the fifth order solution
+        y_new = ys_stage
+        error = dt*sum(e*ki for e, ki in zip(_DP_E, k))
+        scale = atol + rtol*np.maximum(np.abs(y), np.abs(y_new))
+        error_norm = np.sqrt(np.mean((error/scale)**2))
+
+        if error_norm <= 1:
+            ti = ti + dt
+            y = y_new
+            ts.append(ti)
+            ys.append(y)
+            accepted += 1
+            # First same as last: the last stage is the first stage of the next step
+            k[0] = k[6]
+
+        else:
+            rejected += 1
+
+        dt = dt*min(5, max(0.2, 0.9*error_norm**(-1/5) if error_norm > 0 else 5))
+
+    ys = np.array(ys)
+    return np.array(ts), ys[:, 0], ys[:, 1], {'steps': accepted, 'rejected': rejected, 'evaluations': evaluations}
+
+def error_report(m, k, c, b, w, x0, v0, tmax, dts=(0.1, 0.01, 0.001), rtols=(1e-4, 1e-6, 1e-8)):
+    """
+    Runs Euler, RK4 and Verlet for every time step in dts, and RK45 for every
+    tolerance in rtols, and compares them with the analytic solution.
+
+    Returns a list with one dict per run: method, dt or rtol, steps, rhs
+    evaluations and the largest error in x.
+    """
+    rhs = oscillator(m, k, c, b, w)
+    report = []
+
+    for dt in dts:
+        t = np.arange(0, tmax, dt)
+        exact = analytic(t, m, k, c, b, w, x0, v0)
+
+        x = integrator.euler(t, m, k, c, b, w, x0, v0)[0]
+        report.append({'method': 'euler', 'dt': dt, 'max_error': np.max(np.abs(x - exact)), 'steps': len(t)-1, 'evaluations': len(t)})
+
+        for name, solver in (('rk4', rk4), ('verlet', verlet)):
+            x, v, stats = solver(rhs, t, x0, v0)
+            report.append(dict(method=name, dt=dt, max_error=np.max(np.abs(x - exact)), **stats))
+
+    for rtol in rtols:
+        t, x, v, stats = rk45(rhs, 0, tmax, x0, v0, rtol=rtol, atol=rtol*1e-3)
+        exact = analytic(t, m, k, c, b, w, x0, v0)
+        report.append(dict(method='rk45', rtol=rtol, max_error=np.max(np.abs(x - exact)), **stats))
+
+    return report
@@ -0,0 +1,104 @@
+import numpy as np
+import integrator
+import resonance
+
+# Steady state detection for the damped, driven oscillator
+#
+#   m*x'' + c*x' + k*x = b*cos(w*t)
+#
+# The Euler solution from integrator.stream is split into periods of the
+# driving force. For every whole period the amplitude and phase of x are taken
+# from its projection on cos(w*t) and sin(w*t),
+#
+#   x = A*cos(w*t - phi)  =>  A*cos(phi) = 2/N*sum(x*cos(w*t)), A*sin(phi) = 2/N*sum(x*sin(w*t))
+#
+# and the integration stops when they have stopped changing, instead of always
+# running to tmax.
+
+def _cycle_sums(t, x, w, period):
+    # Sums of x*cos(w*t), x*sin(w*t) and the number of steps for every period in the chunk
+    cycle = np.floor(t/period).astype(int)
+    first = cycle[0]
+    cycle -= first
+    n = cycle[-1] + 1
+    wt = w*t
+    sums = np.stack([
+        np.bincount(cycle, weights=x*np.cos(wt), minlength=n),
+        np.bincount(cycle, weights=x*np.sin(wt), minlength=n),
+        np.bincount(cycle, minlength=n).astype(float),
+    ], axis=1)
+    return first, sums
+
+def run_until_steady(m, k, c, b, w, x0, v0, dt, tmax, tol=1e-3, cycles=3, chunk_size=2**14):
+    """
+    Integrates the oscillator with integrator.stream and tracks the amplitude
+    and phase of every period of the driving force while it runs. It stops when
+    both have changed less than tol (relative for the amplitude, in radians for
+    the phase) over cycles periods in a row, or at tmax.
+
+    The result is compared with the stationary amplitude A(w) from
+    amplitude_shift.py (resonance.amplitude) and its phase.
+
+    Returns a dict with converged, settling_time (the start of the first of the
+    steady periods), steps (time steps calculated), amplitude, phase,
+    analytic_amplitude, analytic_phase, amplitude_error (relative), phase_error,
+    and the amplitude and phase of every whole period.
+    """
+    period = 2*np.pi/w
+    amplitudes = []
+    phases = []
+    carry = None
+    steady = 0
+    steps = 0
+    converged = False
+
+    for start, t, x, v, a in integrator.stream(tmax, dt, m, k, c, b, w, x0, v0, chunk_size):
+        steps = start + len(t)
+        first, sums = _cycle_sums(t, x, w, period)
+
+        # The first period in the chunk continues the last one of the previous chunk
+        if carry is not None:
+            if carry[0] == first:
+                sums[0] += carry[1]
+            else:
+                sums = np.vstack([carry[1], sums])
+                first -= 1
+
+        # The last period may continue in the next chunk
+        carry = (first + len(sums) - 1, sums[-1])
+        for cos_sum, sin_sum, n in sums[:-1]:
+            amplitudes.append(2*np.hypot(cos_sum, sin_sum)/n)
+            phases.append(np.arctan2(sin_sum, cos_sum))
+
+            if len(amplitudes) > 1:
+                change = abs(amplitudes[-1] - amplitudes[-2])/amplitudes[-1]
+                turn = abs(np.angle(np.exp(1j*(phases[-1] - phases[-2]))))
+                steady = steady + 1 if change < tol and turn < tol else 0
+                if steady >= cycles:
+                    converged = True
+                    break
+
+        if converged:
+            break
+
+    # The first period counted as steady is the one after the last change larger than tol
+    settling_cycle = len(amplitudes) - steady - 1 if converged else None
+
+    amplitude = amplitudes[-1] if amplitudes else np.nan
+    phase = phases[-1] if phases else np.nan
+    analytic_amplitude = float(resonance.amplitude(w, m, k, c, b))
+    analytic_phase = float(np.arctan2(c*w, m*(k/m - w**2)))
+
+    return {
+        'converged': converged,
+        'settling_time': settling_cycle*period if converged else np.nan,
+        'steps': steps,
+        'amplitude': amplitude,
+        'phase': phase,
+        'analytic_amplitude': analytic_amplitude,
+        'analytic_phase': analytic_phase,
+        'amplitude_error': abs(amplitude - analytic_amplitude)/analytic_amplitude,
+        'phase_error': abs(np.angle(np.exp(1j*(phase - analytic_phase)))),
+        'amplitudes': np.array(amplitudes),
+        'phases': np.array(phases),
+    }
@@ -1,7 +1,36 @@
+from collections import OrderedDict
 from math import radians, degrees
-import matplotlib.pyplot as plt
+import importlib
+import importlib.util
+import os
+import sys
 import numpy as np
 
+# matplotlib and the process pool are imported inside the functions that use them, so importing
+# the model only costs the NumPy import and runs nothing.
+
+def _common(name):
+
+    '''
+
+        Imports common/<name>.py (the shared plotting and timers). common/ is found from the repository root
+        next to this folder and imported as fy122a_common, so importers need neither the root on sys.path
+        nor to be without another package called common.
+
+    '''
+
+    if 'fy122a_common' not in sys.modules:
+        root    = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common')
+        spec    = importlib.util.spec_from_file_location('fy122a_common', os.path.join(root, '__init__.py'),
+                                                         submodule_search_locations=[root])
+
+        sys.modules['fy122a_common'] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sys.modules['fy122a_common'])
+
+    return importlib.import_module('fy122a_common.' + name)
+
+instrument = _common('instrument')
+
 # Sun hours for each month in Visby, Sweden
 sun_hours_visby = [41, 70, 156, 243, 317, 315, 314, 261, 188, 102, 42, 31]
 
@@ -14,14 +43,6 @@ days_months = [
     31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31
 ]
 
-sum = 0
-
-for day in days_months:
-    sum += day
-
-print(sum)
-
-
 # ---- Solar panel parameters ---------------------------------
 
 I_0 = 1360.0                    # Solar constant
@@ -38,6 +59,7 @@ time        = 14.5              # Time of day in hours
 
 # -------------------------------------------------------------
 
+@instrument.timed('au3.calculate_power')
 def calculate_power(day = day, time = time, panel_alt = panel_alt, panel_az = panel_az, follow_sun = False, sun_hour = True):
 
     '''
@@ -58,27 +80,9 @@ def calculate_power(day = day, time = time, panel_alt = panel_alt, panel_az = pa
     
     '''
 
-    declination     = -1 * radians(23.44) * np.cos(radians(360.0/365.0 * day))
-    hour_angle      = radians(15.0) * time - radians(180.0)
-
-    hour_angle = hour_angle if hour_angle != 0 else 0.05
-
-    solar_elevation = np.arcsin(np.sin(declination) * np.sin(panel_lat) + np.cos(declination) * np.cos(panel_lat) * np.cos(hour_angle))
-    solar_azimuth   = radians(180.0) + (-1 if hour_angle > 0 else 1) * np.arccos(
-        (np.sin(panel_lat) * np.sin(solar_elevation) - np.sin(declination)) / (np.cos(panel_lat) * np.cos(solar_elevation))
-    )
-
-    if hour_angle > 0:
-
-        solar_azimuth   = radians(180.0) - 1 * np.arccos(
-            (np.sin(panel_lat) * np.sin(solar_elevation) - np.sin(declination)) / (np.cos(panel_lat) * np.cos(solar_elevation))
-        )
-
-    else: 
-
-        solar_azimuth   = radians(180.0) +  1 * np.arccos(
-            (np.sin(panel_lat) * np.sin(solar_elevation) - np.sin(declination)) / (np.cos(panel_lat) * np.cos(solar_elevation))
-        )
+    # Steps 1-4 only depend on the latitude, day and time, so they are read from the sun position cache
+    solar_elevation, solar_azimuth = sun_cache.get(day, time)
+    solar_elevation, solar_azimuth = solar_elevation[()], solar_azimuth[()]
 
     panel_az    = solar_azimuth     if follow_sun else panel_az
     panel_alt   = solar_elevation   if follow_sun else panel_alt
@@ -102,40 +106,644 @@ def calculate_power(day = day, time = time, panel_alt = panel_alt, panel_az = pa
 
         return max(P, 0)
 
-def calculate_power_over_day(sun_hours, day = day, panel_alt = panel_alt, panel_az = panel_az, follow_sun = False):
+# ---- Vectorized solar engine ---------------------------------
+
+days_of_year    = np.arange(365)    # Day indices used for a full year
+hours_of_day    = np.arange(24)     # Hour samples used for a full day
+
+@instrument.timed('au3.solar_position')
+def solar_position(day, time, latitude = None):
+
+    '''
+
+        Calculates the solar elevation and azimuth angles for the given day(s) and time(s).
+        The inputs broadcast like NumPy arrays, so day[:, None] and time[None, :] give a
+        (days, hours) grid. The equations are the same as in calculate_power (Eq. 1-4).
+
+        Uses the module latitude if latitude is not given. Use sun_cache.get to avoid
+        recalculating the same table.
+
+    '''
+
+    latitude = panel_lat if latitude is None else latitude
+
+    day     = np.asarray(day, dtype=float)
+    time    = np.asarray(time, dtype=float)
+
+    declination     = -1 * radians(23.44) * np.cos(np.radians(360.0/365.0 * day))
+    hour_angle      = radians(15.0) * time - radians(180.0)
+
+    solar_elevation = np.arcsin(np.sin(declination) * np.sin(latitude) + np.cos(declination) * np.cos(latitude) * np.cos(hour_angle))
+
+    # At noon the argument is 1 in exact arithmetic, but rounding can push it just above 1 and give NaN,
+    # so it is clipped instead of moving the hour angle away from 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        azimuth_offset = np.arccos(np.clip(
+            (np.sin(latitude) * np.sin(solar_elevation) - np.sin(declination)) / (np.cos(latitude) * np.cos(solar_elevation)), -1.0, 1.0
+        ))
+
+    solar_azimuth = np.where(hour_angle > 0, radians(180.0) - azimuth_offset, radians(180.0) + azimuth_offset)
+
+    return solar_elevation, solar_azimuth
+
+def _on_grid(values, n):
+
+    # True if all values are whole numbers in 0 .. n-1, i.e. rows or columns of the year table
+    return bool(np.all((values >= 0) & (values < n) & (values == np.floor(values))))
+
+class SunPositionCache:
+
+    '''
+
+        LRU cache of solar elevation and azimuth tables, keyed by (latitude, day, time).
+
+        The sun position does not depend on the panel orientation or efficiency, so repeated runs over
+        panel parameters can share one table per latitude and grid. At most max_bytes of tables are kept
+        in memory, the least recently used ones are evicted first. If cache_dir is given, array tables are
+        also stored there as .npz files and loaded again by later processes.
+
+        Lookups on whole days and hours, such as the single samples of calculate_power or the cloudy hours
+        of calculate_power_over_day, are indexed from the (365, 24) year table of the latitude, so they never
+        get an entry of their own. Other single samples are calculated directly.
+
+        Tables returned as they are stored are read-only, since they are shared between all callers.
+
+    '''
+
+    version     = 2     # Bump when solar_position changes, so old .npz files are not reused
+    entry_bytes = 512   # Memory of an entry besides its arrays (key, dict slot, array headers)
+
+    def __init__(self, max_bytes = 256 * 2 ** 20, cache_dir = None):
+
+        self.max_bytes  = max_bytes
+        self.cache_dir  = cache_dir
+        self.nbytes     = 0
+        self.hits       = 0
+        self.misses     = 0
+        self._tables    = OrderedDict()
+
+    def _path(self, key):
+
+        # hashlib takes longer to import than the rest of the model, so only when tables are stored
+        import hashlib
+
+        digest = hashlib.sha1(repr((self.version,) + key).encode()).hexdigest()
+
+        return os.path.join(self.cache_dir, 'sun_{}.npz'.format(digest))
+
+    def _size(self, table):
+
+        return table[0].nbytes + table[1].nbytes + self.entry_bytes
+
+    def get(self, day, time, latitude = None):
+
+        latitude = panel_lat if latitude is None else latitude
+
+        day     = np.asarray(day, dtype=float)
+        time    = np.asarray(time, dtype=float)
+
+        if day.ndim == 0 and time.ndim == 0:
+            return self._sample(float(day), float(time), latitude)
+
+        if _on_grid(day, len(days_of_year)) and _on_grid(time, len(hours_of_day)):
+            solar_elevation, solar_azimuth = self._year(latitude)
+            index = (day.astype(int), time.astype(int))
+            return solar_elevation[index], solar_azimuth[index]
+
+        key = ('grid', latitude, day.shape, day.tobytes(), time.shape, time.tobytes())
+
+        return self._table(key, day, time, latitude)
+
+    def _year(self, latitude):
+
+        return self._table(('year', latitude), days_of_year[:, None], hours_of_day[None, :], latitude)
+
+    def _sample(self, day, time, latitude):
+
+        d, t = int(day), int(time)
+
+        if d == day and t == time and 0 <= d < len(days_of_year) and 0 <= t < len(hours_of_day):
+            solar_elevation, solar_azimuth = self._year(latitude)
+            return solar_elevation[d, t], solar_azimuth[d, t]
+
+        self.misses += 1
+        instrument.count('au3.sun_cache.misses')
+
+        return solar_position(day, time, latitude)
+
+    def _table(self, key, day, time, latitude):
+
+        table = self._tables.get(key)
+
+        if table is not None:
+            self.hits += 1
+            instrument.count('au3.sun_cache.hits')
+            self._tables.move_to_end(key)
+            return table
+
+        self.misses += 1
+        instrument.count('au3.sun_cache.misses')
+
+        path = None if self.cache_dir is None else self._path(key)
+
+        if path is not None and os.path.exists(path):
+            with np.load(path) as stored:
+                solar_elevation, solar_azimuth = stored['elevation'], stored['azimuth']
+        else:
+            solar_elevation, solar_azimuth = solar_position(day, time, latitude)
+
+            if path is not None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                np.savez(path, elevation=solar_elevation, azimuth=solar_azimuth)
+
+        solar_elevation.setflags(write=False)
+        solar_azimuth.setflags(write=False)
+
+        table               = (solar_elevation, solar_azimuth)
+        self._tables[key]   = table
+        self.nbytes         += self._size(table)
+
+        # Evict the least recently used tables, but always keep the one just added
+        while self.nbytes > self.max_bytes and len(self._tables) > 1:
+            _, old_table = self._tables.popitem(last=False)
+            self.nbytes -= self._size(old_table)
+
+        return table
+
+    def clear(self):
+
+        self._tables.clear()
+        self.nbytes = 0
+        self.hits   = 0
+        self.misses = 0
+
+sun_cache = SunPositionCache()
+
+def calculate_power_grid(day = days_of_year[:, None], time = hours_of_day[None, :], panel_alt = panel_alt, panel_az = panel_az,
+                         follow_sun = False, sun_hour = True, cloudy_irradiance = None):
+
+    '''
+
+        Vectorized version of calculate_power. Calculates the power for whole arrays of days and times
+        in one pass, by default the full (365, 24) year grid.
+
+        sun_hour can be a boolean array broadcastable to the grid. Where it is False, the irradiance is
+        taken from cloudy_irradiance, or drawn with np.random.randint(0, 120) like calculate_power does.
+
+        Negative and NaN powers are set to 0.
+
+    '''
+
+    solar_elevation, solar_azimuth = sun_cache.get(day, time)
+
+    return _panel_power(solar_elevation, solar_azimuth, panel_alt, panel_az, follow_sun, sun_hour, cloudy_irradiance)
+
+@instrument.timed('au3.panel_power')
+def _panel_power(solar_elevation, solar_azimuth, panel_alt, panel_az, follow_sun, sun_hour, cloudy_irradiance,
+                 panel_eff = None, panel_area = None):
+
+    '''
+
+        Calculates the delivered power from the sun angles (Eq. 5-7), see calculate_power_grid.
+        panel_eff and panel_area default to the module values, and can be arrays that broadcast
+        against the angles (one value per site, see calculate_sites).
+
+    '''
+
+    panel_eff   = globals()['panel_eff']    if panel_eff is None    else panel_eff
+    panel_area  = globals()['panel_area']   if panel_area is None   else panel_area
+
+    panel_az    = solar_azimuth     if follow_sun else panel_az
+    panel_alt   = solar_elevation   if follow_sun else panel_alt
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        I_h = 1.1 * I_0 * 0.7 ** (1.0 / np.sin(solar_elevation)) ** 0.678
+
+    if sun_hour is not True:
+        if cloudy_irradiance is None:
+            cloudy_irradiance = np.random.randint(0, 120, size=np.shape(I_h))
+        I_h = np.where(sun_hour, I_h, cloudy_irradiance)
+
+    with np.errstate(invalid='ignore'):
+        I_p = I_h * (np.cos(panel_alt - solar_elevation) * np.cos(panel_az - solar_azimuth) + (1 - np.cos(panel_az - solar_azimuth)) * np.sin(panel_alt) * np.sin(solar_elevation))
+        P   = I_p * panel_eff * panel_area
+
+    return np.where(P > 0, P, 0.0)
+
+# ---- Panel orientation optimizer -----------------------------
+
+def _orientation_energy_chunk(panel_alts, panel_azs, I_h, cos_el, sin_el, cos_az, sin_az):
+
+    '''
+
+        Calculates the energy (kWh) for the orientation pairs (panel_alts[i], panel_azs[i]) over the given
+        sun samples. Eq. 6 is expanded with the angle sum identities, so the trigonometry of the sun samples
+        is done once and each orientation only costs multiplications.
+
+    '''
+
+    panel_alts  = np.asarray(panel_alts)[:, None]
+    panel_azs   = np.asarray(panel_azs)[:, None]
+
+    cos_alt_diff    = np.cos(panel_alts) * cos_el + np.sin(panel_alts) * sin_el
+    cos_az_diff     = np.cos(panel_azs) * cos_az + np.sin(panel_azs) * sin_az
+
+    I_p = I_h * (cos_alt_diff * cos_az_diff + (1 - cos_az_diff) * np.sin(panel_alts) * sin_el)
+    P   = I_p * panel_eff * panel_area
+
+    return np.sum(np.where(P > 0, P, 0.0), axis=1) / 1000
+
+@instrument.timed('au3.calculate_orientation_energy')
+def calculate_orientation_energy(panel_alts, panel_azs, sun_hour = True, cloudy_irradiance = None,
+                                 chunk_size = 2 ** 22, workers = None):
+
+    '''
+
+        Calculates the energy delivered over a year for every combination of panel_alts and panel_azs.
+        Returns an array of shape (len(panel_alts), len(panel_azs)) in kWh.
+
+        The sun geometry does not depend on the panel orientation, so it is calculated once for the year
+        grid. Samples where the irradiance or sun angles are NaN always give 0 W and are dropped up front.
+        The orientations are then evaluated in chunks of at most chunk_size (orientation, sample) pairs,
+        either in this process or spread over a process pool with the given number of workers.
+
+    '''
+
+    panel_alts  = np.atleast_1d(np.asarray(panel_alts, dtype=float))
+    panel_azs   = np.atleast_1d(np.asarray(panel_azs, dtype=float))
+
+    solar_elevation, solar_azimuth = sun_cache.get(days_of_year[:, None], hours_of_day[None, :])
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        I_h = 1.1 * I_0 * 0.7 ** (1.0 / np.sin(solar_elevation)) ** 0.678
+
+    if sun_hour is not True:
+        if cloudy_irradiance is None:
+            cloudy_irradiance = np.random.randint(0, 120, size=np.shape(I_h))
+        I_h = np.where(sun_hour, I_h, cloudy_irradiance)
+
+    valid = np.isfinite(I_h) & np.isfinite(solar_elevation) & np.isfinite(solar_azimuth)
+
+    samples = (
+        I_h[valid], np.cos(solar_elevation[valid]), np.sin(solar_elevation[valid]),
+        np.cos(solar_azimuth[valid]), np.sin(solar_azimuth[valid])
+    )
+
+    alt_grid, az_grid = np.meshgrid(panel_alts, panel_azs, indexing='ij')
+    alt_grid, az_grid = alt_grid.ravel(), az_grid.ravel()
+
+    step    = max(1, chunk_size // max(1, len(samples[0])))
+    chunks  = [(alt_grid[i:i + step], az_grid[i:i + step]) for i in range(0, len(alt_grid), step)]
+
+    if workers is None:
+        energy = [_orientation_energy_chunk(alts, azs, *samples) for alts, azs in chunks]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_orientation_energy_chunk, alts, azs, *samples) for alts, azs in chunks]
+            energy  = [future.result() for future in futures]
+
+    return np.concatenate(energy).reshape(len(panel_alts), len(panel_azs))
+
+def optimize_orientation(panel_alts = np.radians(np.arange(1, 90, 1)), panel_azs = np.radians(np.arange(0, 360, 5)),
+                         refine = 3, sun_hour = True, cloudy_irradiance = None, workers = None):
+
+    '''
+
+        Finds the panel altitude and azimuth that deliver the most energy over a year.
+
+        1. Calculate the energy surface over the panel_alts x panel_azs grid.
+        2. Zoom in on the best grid cell with a finer 11 x 11 grid, refine times.
+
+        Returns the best altitude and azimuth (radians), the best yearly energy (kWh) and the energy
+        surface of the first grid. Nothing is plotted.
+
+    '''
+
+    if sun_hour is not True and cloudy_irradiance is None:
+        # Draw the cloudy irradiance once, so every refinement sees the same weather
+        cloudy_irradiance = np.random.randint(0, 120, size=(len(days_of_year), len(hours_of_day)))
+
+    energy = calculate_orientation_energy(panel_alts, panel_azs, sun_hour=sun_hour, cloudy_irradiance=cloudy_irradiance, workers=workers)
+
+    i, j        = np.unravel_index(np.argmax(energy), energy.shape)
+    best_alt    = panel_alts[i]
+    best_az     = panel_azs[j]
+    best_energy = energy[i, j]
+
+    alt_step = panel_alts[1] - panel_alts[0] if len(panel_alts) > 1 else 0.0
+    az_step  = panel_azs[1] - panel_azs[0] if len(panel_azs) > 1 else 0.0
+
+    for _ in range(refine):
+
+        alts = np.clip(np.linspace(best_alt - alt_step, best_alt + alt_step, 11), 0, radians(90.0))
+        azs  = np.linspace(best_az - az_step, best_az + az_step, 11)
+
+        fine = calculate_orientation_energy(alts, azs, sun_hour=sun_hour, cloudy_irradiance=cloudy_irradiance, workers=workers)
+
+        k, l = np.unravel_index(np.argmax(fine), fine.shape)
+
+        if fine[k, l] > best_energy:
+            best_alt, best_az, best_energy = alts[k], azs[l], fine[k, l]
+
+        alt_step /= 5
+        az_step  /= 5
+
+    return best_alt, best_az % radians(360.0), best_energy, energy
+
+# ---- Sun hour sampling ---------------------------------------
+
+# Average sun hours for each day of the year
+sun_hours_visby_per_day = np.repeat(sun_hours_visby, days_months)
+
+def daylight_window(clear_power):
+
+    '''
+
+        Finds the hours of the day that can be sun hours, from the clear sky power over the last axis.
+        The window starts at the first hour with more than 120 W and ends before the first following
+        hour with less than 120 W (or NaN). If the power never drops again the window is empty.
+
+        Returns the first hour and the end hour (exclusive) of the window for every day.
+
+    '''
+
+    clear_power = np.asarray(clear_power)
+    hours       = np.arange(clear_power.shape[-1])
+
+    above   = clear_power > 120
+    start   = np.argmax(above, axis=-1)
+
+    with np.errstate(invalid='ignore'):
+        below = ~(clear_power >= 120) & (hours >= start[..., None]) & np.any(above, axis=-1)[..., None]
+
+    end     = np.argmax(below, axis=-1)
+    closed  = np.any(below, axis=-1)
+
+    start   = np.where(closed, start, 0)
+    end     = np.where(closed, end, 0)
+
+    return start, end
+
+@instrument.timed('au3.sample_weather')
+def sample_weather(sun_hours, clear_power, rng = None, replicas = None):
+
+    '''
+
+        Samples which hours are sun hours, and the irradiance of the other hours, for many days at once.
+        This is the vectorized and seeded version of the shuffle in calculate_power_over_day.
+
+        sun_hours is the number of sun hours for each day, clear_power the (days, 24) clear sky power used
+        to find the daylight window. In every window int(sun_hours) hours are picked at random as sun hours
+        and the rest get a random irradiance between 0 and 119 W/m^2. Hours outside the window are left
+        as they are (marked as sun hours).
+
+        Returns the sun hour mask and the cloudy irradiance, with shape (days, 24) or (replicas, days, 24).
+        All random numbers are drawn from rng, a np.random.Generator, so a seeded rng gives the same weather.
+
+    '''
+
+    rng         = np.random.default_rng() if rng is None else rng
+    start, end  = daylight_window(clear_power)
+    sun_hours   = np.broadcast_to(np.asarray(sun_hours).astype(int), start.shape)
+
+    shape   = np.shape(clear_power) if replicas is None else (replicas,) + np.shape(clear_power)
+    hours   = np.arange(shape[-1])
+
+    in_window = (hours >= start[..., None]) & (hours < end[..., None])
+
+    # Random keys give every window hour a random rank, hours outside the window are ranked last
+    keys = rng.random(shape)
+    keys = np.where(in_window, keys, 2.0)
+    rank = np.argsort(np.argsort(keys, axis=-1), axis=-1)
+
+    sun_hour = ~in_window | (rank < sun_hours[..., None])
+
+    cloudy_irradiance = np.zeros(shape, dtype=np.int16)
+    cloudy_irradiance[~sun_hour] = rng.integers(0, 120, size=np.count_nonzero(~sun_hour), dtype=np.int16)
+
+    return sun_hour, cloudy_irradiance
+
+# ---- Monte Carlo years ---------------------------------------
+
+# Index of the first day of every month
+month_starts = np.cumsum([0] + days_months[:-1])
+
+def _monte_carlo_batch(seed, replicas, follow_sun, panel_alt, panel_az):
+
+    '''
+
+        Simulates replicas years with their own weather and returns the energy of every month (kWh),
+        with shape (replicas, 12). seed is a np.random.SeedSequence, so every batch has its own stream.
+
+    '''
+
+    rng = np.random.default_rng(seed)
+
+    clear_power                 = calculate_power_grid(follow_sun=follow_sun, panel_alt=panel_alt, panel_az=panel_az)
+    sun_hour, cloudy_irradiance = sample_weather(sun_hours_visby_per_day, clear_power, rng=rng, replicas=replicas)
+
+    power = calculate_power_grid(follow_sun=follow_sun, panel_alt=panel_alt, panel_az=panel_az, sun_hour=sun_hour, cloudy_irradiance=cloudy_irradiance)
+
+    daily_energy = np.sum(power, axis=-1) / 1000
+
+    return np.add.reduceat(daily_energy, month_starts, axis=-1)
+
+@instrument.timed('au3.simulate_years')
+def simulate_years(n_years = 1000, seed = None, batch_size = 100, workers = None,
+                   follow_sun = False, panel_alt = panel_alt, panel_az = panel_az):
+
+    '''
+
+        Monte Carlo simulation of the yearly energy. Runs n_years independent years, each with its own
+        random sun hours, in batches of batch_size years. Every batch gets its own random stream spawned
+        from seed, so the result only depends on seed and batch_size, not on how many workers are used.
+        With workers set, the batches are spread over a process pool.
+
+        Returns a dict of arrays:
+
+            yearly                      energy of every simulated year (kWh), shape (n_years,)
+            monthly                     energy of every month (kWh), shape (n_years, 12)
+            mean, p10, p50, p90         statistics of the yearly energy
+            monthly_mean, monthly_std,
+            monthly_p10, monthly_p50,
+            monthly_p90                 statistics for every month, shape (12,)
+
+    '''
+
+    sizes = [min(batch_size, n_years - start) for start in range(0, n_years, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args  = [(batch_seed, size, follow_sun, panel_alt, panel_az) for batch_seed, size in zip(seeds, sizes)]
+
+    if workers is None:
+        monthly = [_monte_carlo_batch(*batch) for batch in args]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_monte_carlo_batch, *batch) for batch in args]
+            monthly = [future.result() for future in futures]
+
+    monthly = np.concatenate(monthly, axis=0)
+    yearly  = np.sum(monthly, axis=1)
+
+    p10, p50, p90                           = np.percentile(yearly, [10, 50, 90])
+    monthly_p10, monthly_p50, monthly_p90   = np.percentile(monthly, [10, 50, 90], axis=0)
+
+    return {
+        'yearly':       yearly,
+        'monthly':      monthly,
+        'mean':         np.mean(yearly),
+        'p10':          p10,
+        'p50':          p50,
+        'p90':          p90,
+        'monthly_mean': np.mean(monthly, axis=0),
+        'monthly_std':  np.std(monthly, axis=0),
+        'monthly_p10':  monthly_p10,
+        'monthly_p50':  monthly_p50,
+        'monthly_p90':  monthly_p90,
+    }
+
+# ---- Multi-site model ----------------------------------------
+
+# Month index of every day of the year
+month_of_day = np.repeat(np.arange(12), days_months)
+
+def site_table(latitude = panel_lat, panel_alt = panel_alt, panel_az = panel_az, panel_eff = panel_eff, panel_area = panel_area,
+               sun_hours = sun_hours_visby):
+
+    '''
+
+        Creates a table of solar panel sites, as a dict with one array per parameter (one value per site):
+
+            latitude, panel_alt, panel_az   angles in radians, shape (n_sites,)
+            panel_eff, panel_area           efficiency and area (m^2), shape (n_sites,)
+            sun_hours                       average sun hours per day in every month, shape (n_sites, 12)
+
+        All arguments broadcast against each other, so a single value is used for every site. The
+        defaults are the Visby panel, so site_table() is the site used everywhere else in this file.
+
+    '''
+
+    sun_hours   = np.atleast_2d(np.asarray(sun_hours, dtype=float))
+    columns     = np.broadcast_arrays(*[np.atleast_1d(np.asarray(value, dtype=float)) for value in
+                                        (latitude, panel_alt, panel_az, panel_eff, panel_area)] + [sun_hours[:, 0]])
+    n_sites     = len(columns[0])
+
+    table = dict(zip(('latitude', 'panel_alt', 'panel_az', 'panel_eff', 'panel_area'), [np.array(column) for column in columns[:5]]))
+    table['sun_hours'] = np.array(np.broadcast_to(sun_hours, (n_sites, 12)))
+
+    return table
+
+def _sites_chunk(sites, days, follow_sun, weather, seed):
+
+    '''
+
+        Calculates the energy of every site and day (kWh) for a chunk of the site table, from a
+        (sites, days, 24) power grid. With weather, the sun hours are sampled from the monthly sun
+        hours of every site (see sample_weather) with a random stream from seed.
+
+    '''
+
+    column = {key: value[:, None, None] for key, value in sites.items() if key != 'sun_hours'}
+
+    solar_elevation, solar_azimuth = solar_position(days[None, :, None], hours_of_day[None, None, :], column['latitude'])
+
+    power = _panel_power(solar_elevation, solar_azimuth, column['panel_alt'], column['panel_az'], follow_sun, True, None,
+                         column['panel_eff'], column['panel_area'])
+
+    if weather:
+        rng                         = np.random.default_rng(seed)
+        sun_hour, cloudy_irradiance = sample_weather(sites['sun_hours'][:, month_of_day[days]], power, rng=rng)
+
+        power = _panel_power(solar_elevation, solar_azimuth, column['panel_alt'], column['panel_az'], follow_sun, sun_hour,
+                             cloudy_irradiance, column['panel_eff'], column['panel_area'])
+
+    return np.sum(power, axis=-1) / 1000
+
+@instrument.timed('au3.calculate_sites')
+def calculate_sites(sites, days = days_of_year, follow_sun = False, weather = False, seed = None,
+                    chunk_size = 2 ** 22, workers = None):
+
+    '''
+
+        Calculates the energy of many sites at once (see site_table). The power is evaluated on a
+        (sites, days, hours) grid, for as many sites at a time as fit in chunk_size grid values, so the
+        memory use does not depend on the number of sites. With workers set, the chunks are spread over
+        a process pool.
+
+        Without weather every hour is a sun hour (clear sky). With weather the sun hours of every site
+        and day are sampled from the site's monthly sun hours. Every chunk gets its own random stream
+        spawned from seed, so the result only depends on seed and chunk_size (which sets the sites in
+        each chunk), not on how many workers are used.
+
+        Returns a dict of arrays:
+
+            daily_energy    energy of every site and day (kWh), shape (n_sites, n_days)
+            monthly_energy  energy of every site and month (kWh), shape (n_sites, 12)
+            total_energy    energy of every site over all days (kWh), shape (n_sites,)
+
+    '''
+
+    days        = np.atleast_1d(np.asarray(days, dtype=int))
+    n_sites     = len(sites['latitude'])
+    per_chunk   = max(1, chunk_size // (len(days) * len(hours_of_day)))
+
+    starts  = range(0, n_sites, per_chunk)
+    seeds   = np.random.SeedSequence(seed).spawn(len(starts))
+    args    = [({key: value[start:start + per_chunk] for key, value in sites.items()}, days, follow_sun, weather, chunk_seed)
+               for start, chunk_seed in zip(starts, seeds)]
+
+    if workers is None:
+        daily_energy = [_sites_chunk(*chunk) for chunk in args]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures         = [pool.submit(_sites_chunk, *chunk) for chunk in args]
+            daily_energy    = [future.result() for future in futures]
+
+    daily_energy = np.concatenate(daily_energy, axis=0)
+
+    monthly_energy = np.zeros((n_sites, 12))
+    np.add.at(monthly_energy, (slice(None), month_of_day[days]), daily_energy)
+
+    return {
+        'daily_energy':     daily_energy,
+        'monthly_energy':   monthly_energy,
+        'total_energy':     np.sum(daily_energy, axis=1),
+    }
+
+# -------------------------------------------------------------
+
+@instrument.timed('au3.calculate_power_over_day')
+def calculate_power_over_day(sun_hours, day = day, panel_alt = panel_alt, panel_az = panel_az, follow_sun = False, rng = None):
 
     '''
 
         Calculates the power over a day for a given solar panel. This function also adjusts the outputted power
         depending on the given available sun hours for the given day.
 
-        1. Create a random array of True and False values, where True represents a sun hour and False represents a non-sun hour.
-        2. Shuffle the array to create a random distribution of sun hours.
-        3. Calculate the power for each hour of the day.
+        1. Calculate the power for each hour of the day, disregarding clouds.
+        2. Pick a random distribution of sun hours inside the daylight window (see sample_weather).
+        3. Calculate the power again for the hours that are not sun hours.
+
+        Pass a seeded np.random.Generator as rng to get the same result every run.
 
     '''
 
     # First we calculate over day disregarding sun hours
-    y = [calculate_power(time=hour, day=day, follow_sun=follow_sun, panel_alt=panel_alt) for hour in range(24)]
-
-    # Now we get the available total sun hours for that day by checking when the first and last sun hour is
-    y1, y2 = 0, 0
-    y1_indexed = False
-
-    for hour, power in enumerate(y):
-        if power > 120 and not y1_indexed:
-            y1 = hour
-            y1_indexed = True
-        if (power < 120 or np.isnan(power)) and y1_indexed:
-            y2 = hour
-            break
+    y = calculate_power_grid(day=day, time=hours_of_day, follow_sun=follow_sun, panel_alt=panel_alt, panel_az=panel_az)
+
+    sun_hour, cloudy_irradiance = sample_weather(sun_hours, y, rng=rng)
 
-    sun_hours = np.array([True] * int(sun_hours) + [False] * ((y2 - y1) - int(sun_hours)))
-    np.random.shuffle(sun_hours)
+    # Now we recalculate the hours that are not sun hours in one pass
+    cloudy_hours = hours_of_day[~sun_hour]
 
-    # Now we start at y1 and add the sun hours to the array
-    for is_hour, hour in zip(sun_hours, range(y1, y2 + 1)):
-        y[hour] = calculate_power(time=hour, day=day, follow_sun=follow_sun, sun_hour=is_hour, panel_alt=panel_alt)
+    if len(cloudy_hours) > 0:
+        y[cloudy_hours] = calculate_power_grid(day=day, time=cloudy_hours, follow_sun=follow_sun, sun_hour=False, panel_alt=panel_alt, panel_az=panel_az,
+                                               cloudy_irradiance=cloudy_irradiance[~sun_hour])
 
     return y
 
@@ -161,168 +769,304 @@ def calculate_power_over_day(sun_hours, day = day, panel_alt = panel_alt, panel_
 
 # -----------------------------------------------
 
-def calculate_jan_month():
+# ---- Sub-hourly resolution ------------------------------------
 
-    day = 0
-    desired_month = 0
-    for month in days_months[0:desired_month]:
-        day += month
+def day_times(step_minutes = 60, endpoint = True):
 
-    total_energy_delivered = []
+    '''
 
-    for day in range(day, day + days_months[0]):
+        Sample times (hours) over a day with the given step in minutes. With endpoint the last sample is
+        at 24:00, as needed by the trapezoidal and Simpson rules, without it the day ends one step earlier.
 
-        y = calculate_power_over_day(sun_hours=sun_hours_visby[0], day=day, follow_sun=False)
-        # y = calculate_power_over_day(sun_hours=24, day=day, follow_sun=False)
+    '''
 
-        total_energy_delivered.append((np.sum(y)) / 1000)
+    n_steps = 24 * 60 / step_minutes
 
-    total_energy = np.sum(total_energy_delivered)
+    if n_steps != int(n_steps):
+        raise ValueError('step_minutes must divide a day, got {}'.format(step_minutes))
 
-    print("Total energy delivered: {} kWh".format(total_energy))
+    return np.arange(int(n_steps) + (1 if endpoint else 0)) * (step_minutes / 60)
 
-    plt.figure(figsize=[9, 5])  
-    plt.stem(total_energy_delivered, label='Fixed panel')
-    plt.legend(fontsize=15)
-    plt.xlabel('Day',fontsize=15)
-    plt.ylabel('Energy (kWh)',fontsize=15)
-    plt.xticks(range(0, days_months[0]), fontsize=10)
-    plt.yticks(fontsize=12)
-    plt.title('Energy delivered in January')
-    plt.grid()
-    plt.show()
+def integrate_energy(power, step_hours, method = 'trapezoid'):
 
-def calculate_june_month():
+    '''
 
-    day = 0
-    desired_month = 5
-    for month in days_months[0:desired_month]:
-        day += month
+        Integrates power samples (W) taken every step_hours over the last axis and returns the energy (kWh).
 
-    total_energy_delivered = []
+        'sum'        the sum of the samples times the step, like the hourly sums (no endpoint sample)
+        'trapezoid'  the trapezoidal rule
+        'simpson'    Simpson's rule, needs an even number of steps
 
-    for day in range(day, day + days_months[desired_month]):
+    '''
 
-        y = calculate_power_over_day(sun_hours=sun_hours_visby[desired_month], day=day, follow_sun=False)
-        # y = calculate_power_over_day(sun_hours=24, day=day, follow_sun=False)
+    power = np.asarray(power)
 
-        total_energy_delivered.append((np.sum(y)) / 1000)
+    if method == 'sum':
+        energy = np.sum(power, axis=-1) * step_hours
+    elif method == 'trapezoid':
+        energy = (np.sum(power, axis=-1) - 0.5 * (power[..., 0] + power[..., -1])) * step_hours
+    elif method == 'simpson':
+        if (power.shape[-1] - 1) % 2 != 0:
+            raise ValueError("'simpson' needs an even number of steps, got {}".format(power.shape[-1] - 1))
+        energy = (power[..., 0] + power[..., -1] + 4 * np.sum(power[..., 1:-1:2], axis=-1) + 2 * np.sum(power[..., 2:-1:2], axis=-1)) * step_hours / 3
+    else:
+        raise ValueError("method must be 'sum', 'trapezoid' or 'simpson', not {!r}".format(method))
 
-    total_energy = np.sum(total_energy_delivered)
+    return energy / 1000
 
-    print("Total energy delivered: {} kWh".format(total_energy))
+def adaptive_energy(days = days_of_year, tol = 1e-3, max_depth = 10, follow_sun = False, panel_alt = panel_alt, panel_az = panel_az,
+                    sun_hour = True, cloudy_irradiance = None):
 
-    plt.figure(figsize=[9, 5])  
-    plt.stem(total_energy_delivered, label='Fixed panel')
-    plt.legend(fontsize=15)
-    plt.xlabel('Day',fontsize=15)
-    plt.ylabel('Energy (kWh)',fontsize=15)
-    plt.xticks(range(0, days_months[0]), fontsize=10)
-    plt.yticks(fontsize=12)
-    plt.title('Energy delivered in June')
-    plt.grid()
-    plt.show()
+    '''
 
+        Energy delivered every day (kWh) with adaptive Simpson integration. Every hour starts as one interval,
+        and only intervals where Simpson's rule on the two halves differs from the whole by more than the
+        tolerance are split again, so the samples end up around sunrise and sunset where the power changes
+        quickly. All intervals of all days are refined together, one level per pass.
 
-def calculate_june_day():
+        tol is the target error per day (kWh). sun_hour and cloudy_irradiance are (days, 24) arrays as
+        returned by sample_weather, the sun state is constant within every hour.
 
-    day = 0
-    desired_month = 5
-    for month in days_months[0:desired_month]:
-        day += month
+        Returns the daily energy and the number of power evaluations.
 
-    y = calculate_power_over_day(sun_hours=24, day=day, follow_sun=False)
-    y2 = calculate_power_over_day(sun_hours=24, day=day, follow_sun=True)
+    '''
 
-    total_energy_delivered = (np.sum(y) * 24) / 1000
-    print("Total energy delivered: {} kWh".format(total_energy_delivered))
+    days        = np.atleast_1d(np.asarray(days, dtype=int))
+    n_days      = len(days)
+    sun_hour    = np.broadcast_to(sun_hour, (n_days, 24)).ravel()
+    cloudy      = np.zeros(n_days * 24) if cloudy_irradiance is None else np.broadcast_to(cloudy_irradiance, (n_days, 24)).ravel()
 
-    plt.figure(figsize=[9, 5])
-    plt.plot(y, label='Fixed panel')
-    plt.plot(y2, label='Maximum power', linestyle='--')
-    plt.legend(fontsize=15)
-    plt.xlabel('Time (t)',fontsize=15)
-    plt.ylabel('Power (W)',fontsize=15)
-    plt.title('Power over a day',fontsize=15)
-    plt.xticks(range(0, 25), fontsize=12)
-    plt.yticks(fontsize=12)
-    plt.grid()
-    plt.show()
+    def power(day_index, t, state):
+        solar_elevation, solar_azimuth = solar_position(days[day_index], t)
+        return _panel_power(solar_elevation, solar_azimuth, panel_alt, panel_az, follow_sun, sun_hour[state], cloudy[state])
 
-def calculate_january_day():
+    # One interval per hour, state is the index of the (day, hour) the interval belongs to
+    state       = np.arange(n_days * 24)
+    day_index   = state // 24
+    a           = (state % 24).astype(float)
+    b           = a + 1
+
+    fa, fm, fb  = power(day_index, a, state), power(day_index, a + 0.5, state), power(day_index, b, state)
+    whole       = (b - a) / 6 * (fa + 4 * fm + fb)
+    interval_tol = np.full(len(a), 1000 * tol / 24)
+
+    energy      = np.zeros(n_days)
+    evaluations = 3 * len(a)
+
+    for depth in range(max_depth + 1):
+
+        m       = (a + b) / 2
+        f_left  = power(day_index, (a + m) / 2, state)
+        f_right = power(day_index, (m + b) / 2, state)
+
+        evaluations += 2 * len(a)
+
+        left    = (m - a) / 6 * (fa + 4 * f_left + fm)
+        right   = (b - m) / 6 * (fm + 4 * f_right + fb)
+        error   = left + right - whole
+
+        done = (np.abs(error) <= 15 * interval_tol) | (depth == max_depth)
+
+        np.add.at(energy, day_index[done], (left + right + error / 15)[done])
+
+        if np.all(done):
+            break
+
+        # Split the remaining intervals in two halves
+        keep = ~done
+
+        day_index, state    = np.tile(day_index[keep], 2), np.tile(state[keep], 2)
+        interval_tol        = np.tile(interval_tol[keep] / 2, 2)
+
+        a, b        = np.concatenate([a[keep], m[keep]]), np.concatenate([m[keep], b[keep]])
+        fa, fm, fb  = np.concatenate([fa[keep], fm[keep]]), np.concatenate([f_left[keep], f_right[keep]]), np.concatenate([fm[keep], fb[keep]])
+        whole       = np.concatenate([left[keep], right[keep]])
+
+    return energy / 1000, evaluations
+
+# ---- Batch reporting -----------------------------------------
+
+@instrument.timed('au3.calculate_period')
+def calculate_period(month = None, days = None, follow_sun = False, sun_hours = 'visby', panel_alt = panel_alt, panel_az = panel_az, rng = None,
+                     step_minutes = 60, method = 'sum'):
+
+    '''
+
+        Calculates the power and energy for a month or any range of days, without plotting.
+
+        month           month index 0-11, used when days is not given (the whole year if neither is given)
+        days            array of day indices
+        follow_sun      True for a panel that follows the sun
+        sun_hours       'visby' for the average sun hours in Visby, 'clear' for no clouds (every hour a sun
+                        hour), or the number of sun hours per day as a number or an array with one value per day
+        rng             np.random.Generator used to sample the sun hours
+        step_minutes    time between the power samples
+        method          how the energy is integrated: 'sum' (the default, hourly sums as before), 'trapezoid',
+                        'simpson' or 'adaptive' (see integrate_energy and adaptive_energy)
+
+        The sun hours are sampled per hour, and every sample within an hour gets the sun state of that hour.
+
+        Returns a dict of arrays:
+
+            days            day indices, shape (n_days,)
+            months          month index of every day, shape (n_days,)
+            hours           time of day of every power sample (hours), shape (n_samples,)
+            power           power (W), shape (n_days, n_samples)
+            daily_energy    energy delivered every day (kWh), shape (n_days,)
+            monthly_energy  energy delivered in every month (kWh), shape (12,)
+            total_energy    energy delivered over all days (kWh)
+
+    '''
+
+    if days is None:
+        days = days_of_year if month is None else np.arange(month_starts[month], month_starts[month] + days_months[month])
+
+    days    = np.atleast_1d(np.asarray(days, dtype=int))
+    months  = np.searchsorted(month_starts, days, side='right') - 1
+
+    times       = day_times(step_minutes, endpoint=method != 'sum')
+    hour_index  = np.minimum(times.astype(int), 23)
+
+    power = calculate_power_grid(day=days[:, None], time=hours_of_day[None, :], follow_sun=follow_sun, panel_alt=panel_alt, panel_az=panel_az)
+
+    if isinstance(sun_hours, str):
+        if sun_hours not in ('visby', 'clear'):
+            raise ValueError("sun_hours must be 'visby', 'clear', a number or an array, not {!r}".format(sun_hours))
+        sun_hours = None if sun_hours == 'clear' else sun_hours_visby_per_day[days]
+
+    sun_hour, cloudy_irradiance = True, None
+
+    if sun_hours is not None:
+        sun_hour, cloudy_irradiance = sample_weather(np.broadcast_to(sun_hours, days.shape), power, rng=rng)
+
+    if sun_hours is not None or not np.array_equal(times, hours_of_day):
+        power = calculate_power_grid(day=days[:, None], time=times[None, :], follow_sun=follow_sun, panel_alt=panel_alt, panel_az=panel_az,
+                                     sun_hour=sun_hour if sun_hour is True else sun_hour[:, hour_index],
+                                     cloudy_irradiance=None if cloudy_irradiance is None else cloudy_irradiance[:, hour_index])
+
+    if method == 'adaptive':
+        daily_energy, _ = adaptive_energy(days, follow_sun=follow_sun, panel_alt=panel_alt, panel_az=panel_az,
+                                          sun_hour=sun_hour, cloudy_irradiance=cloudy_irradiance)
+    else:
+        daily_energy = integrate_energy(power, step_minutes / 60, method)
+
+    return {
+        'days':             days,
+        'months':           months,
+        'hours':            times,
+        'power':            power,
+        'daily_energy':     daily_energy,
+        'monthly_energy':   np.bincount(months, weights=daily_energy, minlength=12),
+        'total_energy':     np.sum(daily_energy),
+    }
 
-    y = calculate_power_over_day(sun_hours=24, day=10, follow_sun=False)
-    y2 = calculate_power_over_day(sun_hours=24, day=10, follow_sun=True)
+def render_period(results, labels, title):
 
-    total_energy_delivered = (np.sum(y) * 24) / 1000
-    print("Total energy delivered: {} kWh".format(total_energy_delivered))
+    '''
+
+        Plots results from calculate_period. A single day is plotted as power over the day, longer periods
+        as energy per day (a stem plot for one result, lines for several). Only this function needs a plot
+        window, so batch runs can use calculate_period on its own.
+
+    '''
+
+    import matplotlib.pyplot as plt
+    fastplot = _common('fastplot')
 
     plt.figure(figsize=[9, 5])
-    plt.plot(y, label='Fixed panel')
-    plt.plot(y2, label='Maximum power', linestyle='--')
+
+    n_days = len(results[0]['days'])
+
+    if n_days == 1:
+
+        for i, (result, label) in enumerate(zip(results, labels)):
+            fastplot.plot(result['hours'], result['power'][0], label=label, linestyle='-' if i == 0 else '--')
+
+        plt.xlabel('Time (t)',fontsize=15)
+        plt.ylabel('Power (W)',fontsize=15)
+        plt.title(title,fontsize=15)
+        plt.xticks(range(0, 25), fontsize=12)
+
+    else:
+
+        if len(results) == 1:
+            plt.stem(results[0]['daily_energy'], label=labels[0])
+        else:
+            for i, (result, label) in enumerate(zip(results, labels)):
+                fastplot.plot(result['daily_energy'], label=label, linestyle='-' if i == 0 else '--')
+
+        plt.xlabel('Day',fontsize=15)
+        plt.ylabel('Energy (kWh)',fontsize=15)
+        plt.title(title)
+        plt.xticks(range(0, n_days, 1 if n_days <= 31 else 30), fontsize=10)
+
     plt.legend(fontsize=15)
-    plt.xlabel('Time (t)',fontsize=15)
-    plt.ylabel('Power (W)',fontsize=15)
-    plt.title('Power over a day',fontsize=15)
-    plt.xticks(range(0, 25), fontsize=12)
     plt.yticks(fontsize=12)
     plt.grid()
     plt.show()
 
-def calculate_year(altitude=panel_alt):
+# -----------------------------------------------
 
-    total_energy_delivered = []
-    total_energy_delivered_2 = []
+def calculate_jan_month():
 
-    month = 0
-    day_of_month = 0
+    result = calculate_period(month=0)
 
-    for day in range(0, 365):
+    print("Total energy delivered: {} kWh".format(result['total_energy']))
 
-        y = calculate_power_over_day(sun_hours=sun_hours_visby[month], day=day, follow_sun=True)
-        y_2 = calculate_power_over_day(sun_hours=24, day=day, follow_sun=True)
+    render_period([result], ['Fixed panel'], 'Energy delivered in January')
 
-        total_energy_delivered.append((np.sum(y)) / 1000)
-        total_energy_delivered_2.append((np.sum(y_2)) / 1000)
+def calculate_june_month():
 
-        day_of_month += 1
+    result = calculate_period(month=5)
 
-        if day_of_month == days_months[month]:
-            month += 1
-            day_of_month = 0
+    print("Total energy delivered: {} kWh".format(result['total_energy']))
 
+    render_period([result], ['Fixed panel'], 'Energy delivered in June')
 
-    total_energy = np.sum(total_energy_delivered)
+def calculate_june_day():
 
-    # return total_energy
+    fixed   = calculate_period(days=month_starts[5], sun_hours='clear', follow_sun=False)
+    follow  = calculate_period(days=month_starts[5], sun_hours='clear', follow_sun=True)
 
-    print("Total energy delivered: {} kWh".format(total_energy))
+    print("Total energy delivered: {} kWh".format(fixed['total_energy']))
 
-    plt.figure(figsize=[9, 5])  
-    plt.plot(total_energy_delivered, label='Follow sun')
-    plt.plot(total_energy_delivered_2, label='No clouds', linestyle='--')
-    plt.legend(fontsize=15)
-    plt.xlabel('Day',fontsize=15)
-    plt.ylabel('Energy (kWh)',fontsize=15)
-    plt.xticks(range(0, 365, 30), fontsize=10)
-    plt.yticks(fontsize=12)
-    plt.title('Energy delivered in a year')
-    plt.grid()
-    plt.show()
+    render_period([fixed, follow], ['Fixed panel', 'Maximum power'], 'Power over a day')
 
-def calculate_best_altitude():
+def calculate_january_day():
 
-    altitudes = np.arange(1, 90, 1)
+    fixed   = calculate_period(days=10, sun_hours='clear', follow_sun=False)
+    follow  = calculate_period(days=10, sun_hours='clear', follow_sun=True)
+
+    print("Total energy delivered: {} kWh".format(fixed['total_energy']))
+
+    render_period([fixed, follow], ['Fixed panel', 'Maximum power'], 'Power over a day')
+
+def calculate_year(rng=None):
 
-    total_energy_delivered = []
+    result  = calculate_period(follow_sun=True, rng=rng)
+    clear   = calculate_period(follow_sun=True, sun_hours='clear')
 
-    for altitude in altitudes:
+    print("Total energy delivered: {} kWh".format(result['total_energy']))
+
+    render_period([result, clear], ['Follow sun', 'No clouds'], 'Energy delivered in a year')
+
+    return result
+
+def calculate_best_altitude():
+
+    altitudes = np.arange(1, 90, 1)
 
-        total_energy_delivered.append(calculate_year(altitude=radians(altitude)))
+    # One energy column for the fixed azimuth, the sun geometry is shared by all altitudes
+    total_energy_delivered = calculate_orientation_energy(np.radians(altitudes), panel_az)[:, 0]
 
     best_altitude = np.argmax(total_energy_delivered)
     print("Best altitude: {} degrees".format((altitudes[best_altitude])))
 
+    best_alt, best_az, best_energy, _ = optimize_orientation()
+    print("Best orientation: altitude {:.1f} degrees, azimuth {:.1f} degrees ({:.0f} kWh)".format(degrees(best_alt), degrees(best_az), best_energy))
+
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=[9, 5])  
     plt.stem(altitudes, total_energy_delivered, label='Fixed panel')
     plt.legend(fontsize=15)
@@ -336,52 +1080,24 @@ def calculate_best_altitude():
 
 def calculate_with_average():
 
-    target_month    = 5
-    follow_sun      = False
-    sun_hours       = False
-
-    start_day = 0
-    for month in days_months[0:target_month]:
-        start_day += month
-
-    end_day = start_day + days_months[target_month]
-
-    power_hours = [
-
-        calculate_power_over_day(
-            
-            sun_hours=sun_hours_visby[target_month] if sun_hours else 24, day=day, follow_sun=follow_sun
-
-        ) for day in range(start_day, end_day)
-    ]
-
-    print(np.sum(power_hours / 1000))
-
-    # y = 
-    
-    # for day in range(start_day, end_day):
-
-    #     y = calculate_power_over_day(sun_hours=sun_hours_visby[target_month], day=day, follow_sun=True)
+    result = calculate_period(month=5, follow_sun=False, sun_hours='clear')
 
-    #     if day == start_day:
-    #         total_energy_delivered = y
-    #     else:
-    #         total_energy_delivered += y
+    print(result['total_energy'])
 
-    # print(start_day)
+if __name__ == '__main__':
 
-# Uppgift 2 ---------------
+    # Uppgift 2 ---------------
 
-# calculate_january_day()
-# calculate_june_day()
-# calculate_jan_month()
-# calculate_june_month()
-# calculate_year()
+    # calculate_january_day()
+    # calculate_june_day()
+    # calculate_jan_month()
+    # calculate_june_month()
+    # calculate_year()
 
-# Uppgift 3 ---------------
+    # Uppgift 3 ---------------
 
-# calculate_best_altitude()
+    # calculate_best_altitude()
 
-# Uppgift 4 ---------------
+    # Uppgift 4 ---------------
 
-calculate_with_average()
\ No newline at end of file
+    calculate_with_average()
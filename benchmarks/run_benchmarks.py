@@ -0,0 +1,262 @@
+"""
+Benchmarks for the models in AU1, AU2 and AU3.
+
+Every benchmark runs a fixed problem size with fixed seeds, without any plot
+window. The time of a benchmark is the median of a few repeats (timeit), per
+call. With --runs the whole suite is run several times and the median of the
+runs is used, which is the default when saving, so a baseline is not taken
+from one lucky run. The results can be saved as a JSON baseline, and later runs
+are compared against it: a benchmark that is more than threshold times slower
+than its baseline is a regression, and the script exits with status 1.
+Benchmarks of a few microseconds vary more between runs and have a larger
+threshold of their own.
+
+    python benchmarks/run_benchmarks.py                 # compare with baseline.json
+    python benchmarks/run_benchmarks.py --save          # write a new baseline.json
+    python benchmarks/run_benchmarks.py -k au2 --threshold 2
+
+Baselines depend on the machine, so a new baseline should be saved when the
+machine changes. The machine is stored in the baseline for reference.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import timeit
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+for folder in ('AU1', 'AU2', 'AU3'):
+    sys.path.insert(0, os.path.abspath(os.path.join(root, folder)))
+
+import numpy as np
+
+default_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Every benchmark is a function that does the setup and returns the function to time
+benchmarks = {}
+
+def benchmark(name, number=1, threshold=None):
+    def register(setup):
+        benchmarks[name] = (setup, number, threshold)
+        return setup
+    return register
+
+# ---- AU1 ---------------------------------------------
+
+@benchmark('au1.update_sat', number=100000, threshold=2.0)
+def au1_update_sat():
+    import au1_student
+    # Far apart, so no contact (and nothing printed)
+    return lambda: au1_student.update_sat(-100.0, 0.0, 1.0, 0.0, 300.0, 0.01)
+
+@benchmark('au1.simulate', number=5)
+def au1_simulate():
+    import au1_student
+    return lambda: au1_student.simulate(thrust=[(0, 300), (2, 0)], dt=0.01, t_lim=120)
+
+# ---- AU2 ---------------------------------------------
+
+@benchmark('au2.euler', number=5)
+def au2_euler():
+    import integrator
+    t = np.arange(0, 200, 0.001)
+    out = integrator.allocate(len(t))
+    integrator.euler(t, 1, 1, 0.05, 1, 2, 1, 0, out=out)   # compile the kernel before timing
+    return lambda: integrator.euler(t, 1, 1, 0.05, 1, 2, 1, 0, out=out)
+
+@benchmark('au2.euler_batch', number=3)
+def au2_euler_batch():
+    import integrator
+    t = np.arange(0, 10, 0.001)
+    c = np.linspace(0.1, 5, 200)
+    return lambda: integrator.euler_batch(t, 1, 1, c, 0, 0, 1, 0, record_every=10)
+
+@benchmark('au2.stream', number=3)
+def au2_stream():
+    import integrator
+    integrator.run_stream(1, 0.001, 1, 1, 0.05, 1, 2, 1, 0)
+    return lambda: integrator.run_stream(200, 0.001, 1, 1, 0.05, 1, 2, 1, 0, envelope=1000)
+
+@benchmark('au2.amplitude', number=10)
+def au2_amplitude():
+    import resonance
+    omega = np.linspace(0, 2, 10**6)
+    return lambda: resonance.amplitude(omega, 1, 1, 0.5)
+
+@benchmark('au2.resonance', number=10)
+def au2_resonance():
+    import resonance
+    c = np.linspace(0.01, 3, 10**5)
+    return lambda: resonance.resonance(1, 1, c)
+
+@benchmark('au2.rlc_transfer_function', number=10)
+def au2_rlc():
+    import rlc
+    f = np.logspace(0, 6, 10**6)
+    out = np.empty(len(f), dtype=complex)
+    return lambda: rlc.transfer_function(f, out=out)
+
+@benchmark('au2.rlc_tolerance_analysis', number=3)
+def au2_rlc_tolerance():
+    import rlc
+    f = np.logspace(0, 6, 200)
+    return lambda: rlc.tolerance_analysis(10**5, f=f, rng=np.random.default_rng(0))
+
+# ---- AU3 ---------------------------------------------
+
+# The AU3 models share the module-level sun_cache. The benchmarks of whole
+# periods start every timed call from an empty cache, so they include the sun
+# geometry, which is also timed on its own in au3.solar_position.
+
+@benchmark('au3.solar_position', number=20)
+def au3_solar_position():
+    import malmo_test
+    return lambda: malmo_test.solar_position(malmo_test.days_of_year[:, None], malmo_test.hours_of_day[None, :])
+
+@benchmark('au3.calculate_power', number=10)
+def au3_calculate_power():
+    import malmo_test
+    # Warm: the scalar path (Eq. 5-7 and a cache hit) over 500 (day, hour) samples
+    rng = np.random.default_rng(0)
+    samples = list(zip(rng.integers(0, 365, 500).tolist(), rng.integers(0, 24, 500).tolist()))
+    malmo_test.calculate_power(day=172, time=12)
+    def calculate_power():
+        for day, hour in samples:
+            malmo_test.calculate_power(day=day, time=hour)
+    return calculate_power
+
+@benchmark('au3.calculate_power_over_day', number=20)
+def au3_calculate_power_over_day():
+    import malmo_test
+    rng = np.random.default_rng(0)
+    def calculate_power_over_day():
+        malmo_test.sun_cache.clear()
+        malmo_test.calculate_power_over_day(10, day=172, rng=rng)
+    return calculate_power_over_day
+
+@benchmark('au3.calculate_year', number=5)
+def au3_calculate_year():
+    import malmo_test
+    # The calculation in calculate_year, without the plot
+    rng = np.random.default_rng(0)
+    def calculate_year():
+        malmo_test.sun_cache.clear()
+        malmo_test.calculate_period(follow_sun=True, rng=rng)
+    return calculate_year
+
+@benchmark('au3.simulate_years', number=1)
+def au3_simulate_years():
+    import malmo_test
+    def simulate_years():
+        malmo_test.sun_cache.clear()
+        malmo_test.simulate_years(n_years=200, seed=0)
+    return simulate_years
+
+def run(names, repeat=5, runs=1):
+    functions = {}
+    medians = {name: [] for name in names}
+    for k in range(runs):
+        if runs > 1:
+            print('Run {} of {}'.format(k + 1, runs))
+        for name in names:
+            setup, number = benchmarks[name][:2]
+            # The models print results in some places, which is not part of the benchmark
+            with contextlib.redirect_stdout(io.StringIO()):
+                if name not in functions:
+                    functions[name] = setup()
+                times = timeit.Timer(functions[name]).repeat(repeat=repeat, number=number)
+            medians[name].append(float(np.median(times))/number)
+            print('{:32s} {:12.3f} ms'.format(name, medians[name][-1]*1e3))
+
+    results = {}
+    for name in names:
+        results[name] = {'seconds': float(np.median(medians[name])), 'number': benchmarks[name][1], 'repeat': repeat, 'runs': runs}
+    if runs > 1:
+        print()
+        for name in names:
+            print('{:32s} {:12.3f} ms (median of {} runs)'.format(name, results[name]['seconds']*1e3, runs))
+    return results
+
+def machine():
+    try:
+        import numba
+        jit = numba.__version__
+    except ImportError:
+        jit = None
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'numba': jit,
+    }
+
+def compare(results, baseline, threshold):
+    """
+    Returns the names of the benchmarks that are more than threshold times
+    slower than the baseline, or than their own threshold if it is larger, and
+    prints the ratio for every benchmark.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            print('{:32s} no baseline'.format(name))
+            continue
+        ratio = result['seconds']/baseline[name]['seconds']
+        regressed = ratio > max(threshold, benchmarks[name][2] or 0)
+        print('{:32s} {:6.2f}x {}'.format(name, ratio, 'REGRESSION' if regressed else ''))
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-k', dest='pattern', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--baseline', default=default_baseline, help='baseline JSON file')
+    parser.add_argument('--save', action='store_true', help='save the results as the baseline')
+    parser.add_argument('--threshold', type=float, default=1.5, help='largest allowed time relative to the baseline')
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--runs', type=int, help='run the suite this many times and use the median (default 1, 3 with --save)')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    np.random.seed(0)
+    names = [name for name in benchmarks if args.pattern in name]
+    results = run(names, args.repeat, args.runs or (3 if args.save else 1))
+    report = {'machine': machine(), 'benchmarks': results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save:
+        # Keep the baselines of benchmarks that were not run
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                saved = json.load(f)
+            saved['benchmarks'].update(results)
+            results = saved['benchmarks']
+        with open(args.baseline, 'w') as f:
+            json.dump({'machine': machine(), 'benchmarks': results}, f, indent=2)
+        print('Saved baseline to {}'.format(args.baseline))
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline at {}, run with --save first'.format(args.baseline))
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)['benchmarks']
+
+    print()
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print('\n{} regression(s) beyond {}x: {}'.format(len(regressions), args.threshold, ', '.join(regressions)))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
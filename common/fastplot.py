@@ -0,0 +1,147 @@
+import numpy as np
+
+# Plotting of long series
+#
+# A line plot can not show more points than the axes are wide in pixels, so
+# long series are reduced to a few points per pixel column before they are
+# passed to matplotlib. With the default min/max decimation each column keeps
+# the smallest and largest value in it, so peaks and envelopes look exactly
+# the same as with all the points. 'lttb' (largest triangle three buckets)
+# keeps one point per column that preserves the shape of the curve instead.
+#
+# The rendering time then depends on the size of the figure and not on the
+# length of the series. Series that are already short are plotted unchanged.
+
+# Pixel columns of the axes
+def pixel_width(ax):
+    return max(1, int(ax.get_window_extent().width))
+
+# Start index of each bucket when n points are split into buckets equally large parts
+def _bucket_edges(n, buckets):
+    return np.linspace(0, n, buckets + 1).astype(int)[:-1]
+
+def minmax_indices(y, buckets):
+    """
+    Indices of the smallest and largest value in each of buckets equally large
+    parts of y, in order, together with the first and last index.
+    """
+    y = np.asarray(y)
+    n = len(y)
+    if n <= 2*buckets:
+        return np.arange(n)
+
+    # All buckets but the last have the same size, so they can be reshaped
+    size = -(-n//buckets)
+    whole = n//size
+    body = y[:whole*size].reshape(whole, size)
+    offsets = np.arange(whole)*size
+    lo = [offsets + np.argmin(body, axis=1)]
+    hi = [offsets + np.argmax(body, axis=1)]
+
+    if whole*size < n:
+        tail = y[whole*size:]
+        lo.append([whole*size + np.argmin(tail)])
+        hi.append([whole*size + np.argmax(tail)])
+
+    return np.unique(np.concatenate(lo + hi + [[0, n-1]]))
+
+def lttb_indices(x, y, n_out):
+    """
+    Indices of the n_out points chosen by the largest triangle three buckets
+    algorithm: the first and last point, and in every bucket between them the
+    point that makes the largest triangle with the point chosen in the previous
+    bucket and the mean of the next bucket.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    edges = np.append(1 + _bucket_edges(n - 2, n_out - 2), n - 1)
+    chosen = np.empty(n_out, dtype=int)
+    chosen[0] = 0
+    chosen[-1] = n - 1
+
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i+1]
+        next_stop = edges[i+2] if i + 2 < len(edges) else n
+        mean_x = x[stop:next_stop].mean()
+        mean_y = y[stop:next_stop].mean()
+        a = chosen[i]
+
+        area = np.abs((x[a] - mean_x)*(y[start:stop] - y[a]) - (x[a] - x[start:stop])*(mean_y - y[a]))
+        chosen[i+1] = start + np.argmax(area)
+
+    return chosen
+
+def decimate(x, y, points, method='minmax'):
+    """
+    Reduces the series (x, y) to about points values with min/max decimation
+    or to exactly points values with 'lttb'. x must be sorted.
+    """
+    if method == 'minmax':
+        index = minmax_indices(y, max(1, points//2))
+    elif method == 'lttb':
+        index = lttb_indices(x, y, points)
+    else:
+        raise ValueError('Unknown decimation method: {}'.format(method))
+    return np.asarray(x)[index], np.asarray(y)[index]
+
+def _axes(ax):
+    if ax is None:
+        import matplotlib.pyplot as plt
+        ax = plt.gca()
+    return ax
+
+def _columns(x, y):
+    # Like plt.plot: a 2D y is one line per column, and y alone is plotted against its index
+    if y is None:
+        x, y = None, x
+    y = np.asarray(y)
+    x = np.arange(len(y)) if x is None else np.asarray(x)
+    return x, (y[:, None] if y.ndim == 1 else y)
+
+def plot(x, y=None, *args, ax=None, method='minmax', points_per_pixel=2, **kwargs):
+    """
+    ax.plot(x, y, ...) with every line decimated to the pixel width of the
+    axes. ax is the current axes by default. Returns the lines like ax.plot.
+    """
+    return _plot('plot', x, y, args, ax, method, points_per_pixel, kwargs)
+
+def semilogx(x, y=None, *args, ax=None, method='minmax', points_per_pixel=2, **kwargs):
+    """
+    ax.semilogx with decimation, see plot. The buckets are equally many points,
+    so they are equally wide on the axis when x is log spaced.
+    """
+    return _plot('semilogx', x, y, args, ax, method, points_per_pixel, kwargs)
+
+def _plot(name, x, y, args, ax, method, points_per_pixel, kwargs):
+    ax = _axes(ax)
+    x, y = _columns(x, y)
+    points = points_per_pixel*pixel_width(ax)
+
+    lines = []
+    for i in range(y.shape[1]):
+        xd, yd = decimate(x, y[:, i], points, method)
+        lines += getattr(ax, name)(xd, yd, *args, **kwargs)
+    return lines
+
+def fill_between(x, y1, y2, ax=None, points_per_pixel=1, **kwargs):
+    """
+    ax.fill_between with the lower curve reduced to its minimum and the upper
+    curve to its maximum in every pixel column, so the filled area still covers
+    every point.
+    """
+    ax = _axes(ax)
+    x = np.asarray(x)
+    y1, y2 = np.broadcast_arrays(np.asarray(y1), np.asarray(y2))
+    buckets = points_per_pixel*pixel_width(ax)
+
+    if len(x) > 2*buckets:
+        edges = _bucket_edges(len(x), buckets)
+        x = np.append(x[edges], x[-1])
+        y1 = np.append(np.minimum.reduceat(y1, edges), y1[-1])
+        y2 = np.append(np.maximum.reduceat(y2, edges), y2[-1])
+
+    return ax.fill_between(x, y1, y2, **kwargs)
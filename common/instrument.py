@@ -0,0 +1,135 @@
+import atexit
+import json
+import marshal
+import os
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+# Timers and counters for the hot paths of the models
+#
+# Instrumentation is off unless the environment variable FY122A_INSTRUMENT is
+# set when the module is imported. Its value is the file the summary is written
+# to at exit: a .prof or .pstats file is written in the cProfile format (open it
+# with pstats.Stats or snakeviz), anything else as JSON. FY122A_INSTRUMENT=1
+# writes instrument.json in the working directory.
+#
+# When it is off, timed() returns the function unchanged and timer() returns
+# one shared empty context manager, so the instrumented code runs as before.
+# Functions decorated with timed() are only wrapped if instrumentation was on
+# when they were defined. The models import this module from its file (as
+# fy122a_common.instrument), so it works however they are imported.
+#
+# Timers can be nested. Every timer keeps its total time and its own time, the
+# total minus the time of the timers started inside it (in the same thread).
+
+output = os.environ.get('FY122A_INSTRUMENT')
+if output == '1':
+    output = 'instrument.json'
+enabled = bool(output)
+
+# name -> [calls, total seconds, longest call in seconds, own seconds]
+timers = {}
+# name -> count
+counters = {}
+
+_disabled = nullcontext()
+# The running timers of every thread, innermost last
+_local = threading.local()
+
+class _Timer:
+    __slots__ = ('stats', 'start', 'inner')
+
+    def __init__(self, name):
+        self.stats = timers.setdefault(name, [0, 0.0, 0.0, 0.0])
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self)
+        self.inner = 0.0
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = _local.stack
+        stack.pop()
+        if stack:
+            stack[-1].inner += elapsed
+        stats = self.stats
+        stats[0] += 1
+        stats[1] += elapsed
+        if elapsed > stats[2]:
+            stats[2] = elapsed
+        stats[3] += elapsed - self.inner
+        return False
+
+def timer(name):
+    """
+    Context manager that adds the time of the with block to the timer name.
+    """
+    return _Timer(name) if enabled else _disabled
+
+def timed(name=None):
+    """
+    Decorator that times every call of the function, under name or the
+    qualified name of the function.
+    """
+    def decorate(function):
+        if not enabled:
+            return function
+        label = name or '{}.{}'.format(function.__module__, function.__qualname__)
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with _Timer(label):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count(name, n=1):
+    if enabled:
+        counters[name] = counters.get(name, 0) + n
+
+def summary():
+    """
+    The timers (calls, total, own, mean and max in seconds) and the counters.
+    """
+    return {
+        'timers': {name: {'calls': calls, 'total': total, 'own': own, 'mean': total/calls if calls else 0.0, 'max': longest}
+                   for name, (calls, total, longest, own) in sorted(timers.items(), key=lambda item: -item[1][1])},
+        'counters': dict(sorted(counters.items())),
+    }
+
+def dump(path=None):
+    """
+    Writes the summary to path (default the FY122A_INSTRUMENT file), as JSON or
+    for a .prof/.pstats path in the marshal format that pstats.Stats reads.
+    Every timer is one entry, with its own time as tottime, its total time as
+    cumtime and no callers. The counters are only written to JSON.
+    """
+    path = path or output
+    if not path:
+        raise ValueError('dump() needs a path when FY122A_INSTRUMENT is not set')
+    if path.endswith(('.prof', '.pstats')):
+        stats = {('instrument', 0, name): (calls, calls, own, total, {})
+                 for name, (calls, total, longest, own) in timers.items()}
+        with open(path, 'wb') as f:
+            marshal.dump(stats, f)
+    else:
+        with open(path, 'w') as f:
+            json.dump(summary(), f, indent=2)
+
+def reset():
+    timers.clear()
+    counters.clear()
+
+def _dump_at_exit():
+    if timers or counters:
+        dump()
+
+if enabled:
+    atexit.register(_dump_at_exit)